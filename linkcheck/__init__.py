@@ -1,4 +1,6 @@
+import codecs
 import threading
+from email.message import Message
 from html.parser import HTMLParser
 
 # A global lock, showing whether linkcheck is busy
@@ -71,6 +73,71 @@ class AnchorLister(HTMLParser):
                 self.names.append(name[0])
 
 
+class AnchorFinder(AnchorLister):
+    """
+    Search a document for anchors while it is downloaded.
+
+    The raw bytes of the document are passed to `feed_bytes()` as they arrive, which returns
+    True as soon as all `anchors` were found or more than `max_bytes` were received, so the
+    rest of the document does not have to be read. `find_anchor()` then returns True if an
+    anchor was found, False if not, and None if the document was too large to search it completely.
+    """
+
+    def __init__(self, anchors, content_type="", max_bytes=None):
+        # The empty anchor "#" is always valid
+        self.anchors = {anchor for anchor in anchors if anchor}
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.found = set()
+        self.truncated = False
+        self.closed = False
+        self.error = None
+        message = Message()
+        message["content-type"] = content_type
+        try:
+            self.decoder = codecs.getincrementaldecoder(message.get_content_charset() or "utf-8")(errors="replace")
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        super().__init__()
+
+    @property
+    def complete(self):
+        return self.found >= self.anchors
+
+    def handle_starttag(self, tag, attributes):
+        count = len(self.names)
+        super().handle_starttag(tag, attributes)
+        self.found.update(self.anchors.intersection(self.names[count:]))
+
+    def feed_bytes(self, chunk):
+        if self.max_bytes and self.size >= self.max_bytes:
+            self.truncated = True
+        if self.complete or self.truncated or self.error:
+            return True
+        if self.max_bytes and len(chunk) > self.max_bytes - self.size:
+            # Also when it is the last chunk, the rest of the document is not searched
+            self.truncated = True
+            chunk = chunk[:self.max_bytes - self.size]
+        self.size += len(chunk)
+        try:
+            self.feed(self.decoder.decode(chunk))
+        # Keep parsing errors until the anchors are checked
+        except Exception as e:
+            self.error = e
+        return self.complete or self.truncated or self.error is not None
+
+    def find_anchor(self, anchor):
+        if self.error:
+            raise self.error
+        if not self.closed and not self.complete and not self.truncated:
+            self.feed(self.decoder.decode(b"", final=True))
+            self.close()
+        self.closed = True
+        if anchor in self.found:
+            return True
+        return None if self.truncated else False
+
+
 def parse(obj, field, parser):
     html = getattr(obj, field)
     if html:
@@ -118,6 +185,12 @@ class Linklist:
     object_exclude = None
     filter_callable = None
 
+    # Set resolve_only to True to validate the internal links of the objects by resolving
+    # their path instead of rendering the page, see the LINKCHECK_RESOLVE_URLS setting.
+    # Links with an anchor and paths which don't resolve are still checked by rendering the page.
+
+    resolve_only = False
+
     def __get(self, name, obj, default=None):
         try:
             attr = getattr(self, name)
@@ -192,23 +265,36 @@ class Linklist:
         return objects
 
     def get_linklist(self, extra_filter=None):
+        return list(self.iter_linklist(extra_filter))
 
+    def iter_linklist(self, extra_filter=None):
+        """
+        Like `get_linklist()`, but yield the objects one after the other while they are
+        read in chunks, so that the memory use does not grow with the number of objects.
+        """
         extra_filter = extra_filter or {}
 
-        linklist = []
         objects = self.objects()
 
         if extra_filter:
             objects = objects.filter(**extra_filter)
 
-        for obj in objects:
-            linklist.append({
+        # Only load the fields containing links, unless the links are found in other ways
+        field_names = {field.name for field in self.model._meta.concrete_fields}
+        link_fields = {*self.html_fields, *self.url_fields, *self.image_fields}
+        if (
+            link_fields <= field_names
+            and type(self).urls is Linklist.urls
+            and type(self).images is Linklist.images
+        ):
+            objects = objects.only(*link_fields)
+
+        for obj in objects.iterator(chunk_size=2000):
+            yield {
                 'object': obj,
                 'urls': self.urls(obj),
                 'images': self.images(obj),
-            })
-
-        return linklist
+            }
 
     @classmethod
     def content_type(cls):
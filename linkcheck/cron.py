@@ -9,10 +9,7 @@
 
 from django_cron import WEEK, Job, cronScheduler
 
-from linkcheck.linkcheck_settings import (
-    EXTERNAL_RECHECK_INTERVAL,
-    MAX_CHECKS_PER_RUN,
-)
+from linkcheck.linkcheck_settings import MAX_CHECKS_PER_RUN
 from linkcheck.utils import check_links, find_all_links
 
 
@@ -43,11 +40,7 @@ class RunLinkCheckExternal(Job):
     run_every = WEEK
 
     def job(self):
-        check_links(
-            external_recheck_interval=EXTERNAL_RECHECK_INTERVAL,
-            limit=MAX_CHECKS_PER_RUN,
-            check_internal=False,
-        )
+        check_links(limit=MAX_CHECKS_PER_RUN, check_internal=False)
 
 
 cronScheduler.register(RunLinkCheckExternal)
@@ -0,0 +1,281 @@
+"""
+Engines which check external links concurrently.
+
+An engine is used as a context manager for the duration of a run. Its `submit()`
+method starts the check of an external `Url` without saving it and returns a
+`concurrent.futures.Future` resolving to the status of the check.
+"""
+import asyncio
+import logging
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from threading import Thread
+from urllib.parse import urlparse
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import AnchorFinder
+from .linkcheck_settings import (
+    ANCHOR_MAX_BYTES,
+    LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT,
+    POOL_MAXSIZE,
+    PROXIES,
+    TRUST_PROXY_SSL,
+)
+from .models import (
+    ANCHOR_CHUNK_SIZE,
+    FALLBACK_USER_AGENT,
+    RESULT_FIELDS,
+    Host,
+    get_common_validators,
+    get_session,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadEngine:
+    """
+    Check external links in a pool of threads sharing one requests session,
+    which keeps at most `LINKCHECK_POOL_MAXSIZE` connections per host
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def __enter__(self):
+        # More connections per host than threads would never be used
+        self.session = get_session(pool_maxsize=min(POOL_MAXSIZE, self.workers))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+        self.session.close()
+
+    def submit(self, url, followers=(), host=None):
+        # The caller decides whether the URL is due for a recheck
+        return self.executor.submit(
+            url.check_external,
+            external_recheck_interval=0,
+            session=self.session,
+            commit=False,
+            followers=followers,
+            host=host,
+        )
+
+
+class AsyncEngine:
+    """
+    Check external links with aiohttp in an asyncio event loop running in a background thread.
+    `workers` is the maximum number of simultaneous connections, and at most
+    `LINKCHECK_POOL_MAXSIZE` of them are opened to the same host.
+    """
+
+    def __init__(self, workers):
+        if aiohttp is None:
+            raise ImproperlyConfigured("The async engine requires aiohttp, install it with `pip install aiohttp`.")
+        self.workers = workers
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = self.run(self.open_session()).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.run(self.session.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def open_session(self):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.workers, limit_per_host=POOL_MAXSIZE),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT,
+                sock_read=LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT,
+            ),
+        )
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def submit(self, url, followers=(), host=None):
+        return self.run(check_external_async(url, self.session, followers, host))
+
+
+ENGINES = {
+    "sync": ThreadEngine,
+    "async": AsyncEngine,
+}
+
+
+def get_engine(name, workers):
+    return ENGINES[name](workers)
+
+
+# The parts of an aiohttp response which are needed after the connection is released
+AsyncResponse = namedtuple(
+    "AsyncResponse", ["status", "reason", "history", "url", "content_type", "headers", "content"]
+)
+
+
+async def fetch_async(session, method, external_url, headers, verify, anchors=None):
+    """
+    Make a request and read the document until the given `anchors` are found
+    (the document is not read if `anchors` is None)
+    """
+    async with session.request(
+        method,
+        external_url,
+        allow_redirects=True,
+        headers=headers,
+        ssl=verify,
+        proxy=PROXIES.get(urlparse(external_url).scheme),
+    ) as response:
+        content = None
+        if anchors is not None:
+            # Read the document only until the anchors are found
+            content = AnchorFinder(anchors, response.headers.get("Content-Type", ""), ANCHOR_MAX_BYTES)
+            async for chunk in response.content.iter_chunked(ANCHOR_CHUNK_SIZE):
+                if content.feed_bytes(chunk):
+                    break
+        return AsyncResponse(
+            status=response.status,
+            reason=response.reason,
+            # A redirect without location is the final response, but aiohttp also adds it to the history
+            history=[(r.status, r.reason) for r in response.history if r is not response],
+            url=str(response.url),
+            content_type=response.content_type,
+            headers=response.headers,
+            content=content,
+        )
+
+
+async def check_external_async(url, session, followers=(), host=None):
+    """
+    Check an external URL with aiohttp, following the same steps as `Url.check_external`.
+    The result is not saved, so this coroutine does not access the database.
+    """
+    logger.info("checking external link: %s", url.url)
+    urls = [url, *followers]
+
+    # Keep the last results in case the response is "304 Not Modified"
+    validators = get_common_validators(urls)
+    previous_results = [{field: getattr(u, field) for field in RESULT_FIELDS} if validators else None for u in urls]
+
+    # Reset all fields in case they were already set
+    for u in urls:
+        u.reset_for_check()
+
+    has_anchor = any(u.has_anchor for u in urls)
+    host = host or Host()
+    headers = {"User-Agent": host.user_agent, **validators}
+    verify = not host.skip_ssl_verification and not (PROXIES and TRUST_PROXY_SSL)
+    # At first try a HEAD request, unless the host does not allow it
+    method = "GET" if host.use_get else "HEAD"
+
+    def fetch():
+        anchors = [u.anchor for u in urls] if method == "GET" and has_anchor else None
+        return fetch_async(session, method, url.external_url, headers, verify, anchors)
+
+    ssl_status = None
+    error = None
+    host_unreachable = timed_out = False
+    try:
+        try:
+            # At first try a HEAD request
+            response = await fetch()
+            # If no exceptions occur, the SSL certificate is valid, if it was verified
+            if url.external_url.startswith("https://") and verify:
+                ssl_status = True
+        except aiohttp.ClientSSLError as e:
+            # This error could also be caused by an incomplete root certificate bundle,
+            # so let's retry without verifying the certificate
+            if "unable to get local issuer certificate" in str(e):
+                verify = False
+                response = await fetch()
+                host.learn(skip_ssl_verification=True)
+            else:
+                raise
+        # If HEAD is not allowed, let's try with GET
+        if method == "HEAD" and response.status in [HTTPStatus.BAD_REQUEST, HTTPStatus.METHOD_NOT_ALLOWED]:
+            logger.debug("HEAD is not allowed, retry with GET")
+            method = "GET"
+            response = await fetch()
+            if response.status not in [HTTPStatus.BAD_REQUEST, HTTPStatus.METHOD_NOT_ALLOWED]:
+                host.learn(use_get=True)
+        # If access is denied, possibly the user agent is blocked
+        if response.status == HTTPStatus.FORBIDDEN and not host.use_fallback_user_agent:
+            logger.debug("Forbidden, retry with different user agent")
+            headers = {"User-Agent": FALLBACK_USER_AGENT}
+            response = await fetch()
+            if response.status != HTTPStatus.FORBIDDEN:
+                host.learn(use_fallback_user_agent=True)
+        # If URL contains hash anchor and is a valid HTML document, let's repeat with GET
+        elif (
+            has_anchor
+            and response.status < 400
+            and response.status != HTTPStatus.NOT_MODIFIED
+            and method == "HEAD"
+            and response.content_type == "text/html"
+        ):
+            logger.debug("Retrieve content for anchor check")
+            method = "GET"
+            response = await fetch()
+    except asyncio.TimeoutError:
+        error = ("Other Error: The read operation timed out", "The read operation timed out")
+        timed_out = True
+    except aiohttp.ClientConnectorError as e:
+        error = (format_client_connector_error(e),) * 2
+        if isinstance(e, aiohttp.ClientSSLError):
+            ssl_status = False
+        else:
+            host_unreachable = True
+    except Exception as e:
+        error = (f"Other Error: {e}", str(e))
+
+    for u, previous_result in zip(urls, previous_results):
+        u.ssl_status = ssl_status
+        if error:
+            u.status = False
+            u.message, u.error_message = error
+            u.host_unreachable = host_unreachable
+            u.timed_out = timed_out
+        else:
+            u.record_external_response(
+                response.status,
+                response.reason,
+                history=response.history,
+                final_url=response.url,
+                content=response.content,
+                verified=verify,
+                headers=response.headers,
+                previous_result=previous_result,
+            )
+    for u in followers:
+        u.finish_external_check(commit=False)
+    return url.finish_external_check(commit=False)
+
+
+def format_client_connector_error(e):
+    """
+    Helper function to format aiohttp connection errors like `format_connection_error`
+    """
+    if isinstance(e, aiohttp.ClientSSLError):
+        # If the reason lies withing the ssl c library, hide additional debug output
+        ssl_c_reason = re.search(r"\[SSL: [A-Z\d_]+\] (.+) \(_ssl\.c:\d+\)", str(e.os_error))
+        return f"SSL Error: {ssl_c_reason[1] if ssl_c_reason else e.os_error}"
+    # ClientConnectorDNSError was added in aiohttp 3.10
+    if isinstance(e, getattr(aiohttp, "ClientConnectorDNSError", ())):
+        return f"Name Resolution Error: Failed to resolve '{e.host}' ({e.os_error})"
+    return f"New Connection Error: Failed to establish a new connection: {e.os_error}"
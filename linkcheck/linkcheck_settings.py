@@ -50,9 +50,12 @@ URL_FIELD_CLASSES = getattr(settings, 'LINKCHECK_EXTRA_URL_FIELD_CLASSES', []) +
 # Main (non-coverage related) settings
 
 EXTERNAL_RECHECK_INTERVAL = getattr(settings, 'LINKCHECK_EXTERNAL_RECHECK_INTERVAL', 10080)  # 1 week
+MAX_RECHECK_INTERVAL = getattr(settings, 'LINKCHECK_MAX_RECHECK_INTERVAL', 4 * EXTERNAL_RECHECK_INTERVAL)
+RECHECK_JITTER = getattr(settings, 'LINKCHECK_RECHECK_JITTER', 0.1)
 EXTERNAL_REGEX_STRING = getattr(settings, 'LINKCHECK_EXTERNAL_REGEX_STRING', r'^https?://')
 LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT = getattr(settings, 'LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT', 10)
 MAX_CHECKS_PER_RUN = getattr(settings, 'LINKCHECK_MAX_CHECKS_PER_RUN', -1)
+MAX_DURATION = getattr(settings, 'LINKCHECK_MAX_DURATION', None)
 MAX_URL_LENGTH = getattr(settings, 'LINKCHECK_MAX_URL_LENGTH', 255)
 MEDIA_PREFIX = getattr(settings, 'LINKCHECK_MEDIA_PREFIX', settings.MEDIA_URL)
 RESULTS_PER_PAGE = getattr(settings, 'LINKCHECK_RESULTS_PER_PAGE', 500)
@@ -61,3 +64,23 @@ DISABLE_LISTENERS = getattr(settings, 'LINKCHECK_DISABLE_LISTENERS', False)
 TOLERATE_BROKEN_ANCHOR = getattr(settings, 'LINKCHECK_TOLERATE_BROKEN_ANCHOR', True)
 PROXIES = getattr(settings, 'LINKCHECK_PROXIES', {})
 TRUST_PROXY_SSL = getattr(settings, 'LINKCHECK_TRUST_PROXY_SSL', False)
+POOL_CONNECTIONS = getattr(settings, 'LINKCHECK_POOL_CONNECTIONS', 10)
+POOL_MAXSIZE = getattr(settings, 'LINKCHECK_POOL_MAXSIZE', 10)
+WORKERS = getattr(settings, 'LINKCHECK_WORKERS', 1)
+PROCESSES = getattr(settings, 'LINKCHECK_PROCESSES', 1)
+ENGINE = getattr(settings, 'LINKCHECK_ENGINE', 'sync')
+HOST_CONCURRENCY = getattr(settings, 'LINKCHECK_HOST_CONCURRENCY', 2)
+HOST_DELAY = getattr(settings, 'LINKCHECK_HOST_DELAY', 0)
+MAX_RETRY_AFTER = getattr(settings, 'LINKCHECK_MAX_RETRY_AFTER', 300)
+DEAD_HOST_THRESHOLD = getattr(settings, 'LINKCHECK_DEAD_HOST_THRESHOLD', 2)
+DEAD_HOST_TTL = getattr(settings, 'LINKCHECK_DEAD_HOST_TTL', 0)
+HOST_STRATEGY_TTL = getattr(settings, 'LINKCHECK_HOST_STRATEGY_TTL', 7 * 24 * 60 * 60)
+CIRCUIT_BREAKER_THRESHOLD = getattr(settings, 'LINKCHECK_CIRCUIT_BREAKER_THRESHOLD', 3)
+CIRCUIT_BREAKER_COOLDOWN = getattr(settings, 'LINKCHECK_CIRCUIT_BREAKER_COOLDOWN', 60)
+ANCHOR_MAX_BYTES = getattr(settings, 'LINKCHECK_ANCHOR_MAX_BYTES', 5 * 1024 * 1024)
+WRITE_BATCH_SIZE = getattr(settings, 'LINKCHECK_WRITE_BATCH_SIZE', 100)
+PRIORITIZE_BROKEN = getattr(settings, 'LINKCHECK_PRIORITIZE_BROKEN', False)
+PRIORITIZE_LINKED = getattr(settings, 'LINKCHECK_PRIORITIZE_LINKED', False)
+LEASE_DURATION = getattr(settings, 'LINKCHECK_LEASE_DURATION', 0)
+RESOLVE_URLS = getattr(settings, 'LINKCHECK_RESOLVE_URLS', {})
+SITEMAPS = getattr(settings, 'LINKCHECK_SITEMAPS', None)
@@ -1,8 +1,11 @@
 from django.core.management.base import BaseCommand
 
+from linkcheck.engines import ENGINES
 from linkcheck.linkcheck_settings import (
-    EXTERNAL_RECHECK_INTERVAL,
+    ENGINE,
     MAX_CHECKS_PER_RUN,
+    MAX_DURATION,
+    WORKERS,
 )
 from linkcheck.utils import check_links
 
@@ -15,21 +18,52 @@ class Command(BaseCommand):
         parser.add_argument(
             '-e', '--externalinterval', type=int,
             help='Specifies the length of time in minutes until external links are rechecked. '
-                 'Defaults to linkcheck_config setting'
+                 'By default, they are rechecked when they are due (see linkcheck_config setting)'
         )
         parser.add_argument(
             '-l', '--limit', type=int,
             help='Specifies the maximum number (int) of links to be checked. '
                  'Defaults to linkcheck_config setting.  Value less than 1 will check all'
         )
+        parser.add_argument(
+            '-d', '--max-duration', type=int,
+            help='Specifies the maximum duration in seconds of the run, after which no more links are checked. '
+                 'Defaults to linkcheck_config setting'
+        )
+        parser.add_argument(
+            '-w', '--workers', type=int,
+            help='Specifies the number of external links which are checked in parallel. '
+                 'Defaults to linkcheck_config setting'
+        )
+        parser.add_argument(
+            '--engine', choices=list(ENGINES),
+            help='Specifies the engine used to check external links in parallel. '
+                 'Defaults to linkcheck_config setting'
+        )
 
     def handle(self, *args, **options):
-        externalinterval = options['externalinterval'] or EXTERNAL_RECHECK_INTERVAL
+        externalinterval = options['externalinterval']
+        workers = options.get('workers', None) or WORKERS
+        engine = options.get('engine', None) or ENGINE
         limit = options.get('limit', None) or MAX_CHECKS_PER_RUN
+        max_duration = options.get('max_duration', None) or MAX_DURATION
 
-        self.stdout.write(f"Checking all external links that haven't been tested for {externalinterval} minutes.")
+        if externalinterval is not None:
+            self.stdout.write(f"Checking all external links that haven't been tested for {externalinterval} minutes.")
+        else:
+            self.stdout.write("Checking all external links which are due for a recheck.")
         if limit != -1:
             self.stdout.write(f"Will run maximum of {limit} checks this run.")
+        if max_duration:
+            self.stdout.write(f"Will stop checking after {max_duration} seconds.")
 
-        check_count = check_links(external_recheck_interval=externalinterval, limit=limit, check_internal=False)
+        check_count = check_links(
+            # By default, the URLs are rechecked at their next_check_at date
+            external_recheck_interval=externalinterval,
+            limit=limit,
+            check_internal=False,
+            workers=workers,
+            engine=engine,
+            max_duration=max_duration,
+        )
         return f"{check_count} external URLs have been checked."
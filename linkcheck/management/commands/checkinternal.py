@@ -1,6 +1,12 @@
 from django.core.management.base import BaseCommand
 
-from linkcheck.linkcheck_settings import MAX_CHECKS_PER_RUN
+from linkcheck.linkcheck_settings import (
+    MAX_CHECKS_PER_RUN,
+    MAX_DURATION,
+    PROCESSES,
+    SITEMAPS,
+    WORKERS,
+)
 from linkcheck.utils import check_links
 
 
@@ -13,13 +19,42 @@ class Command(BaseCommand):
             '-l', '--limit', type=int,
             help='Specifies the maximum number (int) of links to be checked. '
                  'Defaults to linkcheck_config setting.  Value less than 1 will check all')
+        parser.add_argument(
+            '-d', '--max-duration', type=int,
+            help='Specifies the maximum duration in seconds of the run, after which no more links are checked. '
+                 'Defaults to linkcheck_config setting')
+        parser.add_argument(
+            '-w', '--workers', type=int,
+            help='Specifies the number of threads in which links are checked in parallel. '
+                 'Defaults to linkcheck_config setting')
+        parser.add_argument(
+            '-p', '--processes', type=int,
+            help='Specifies the number of processes in which links are checked in parallel. '
+                 'Defaults to linkcheck_config setting')
+        parser.add_argument(
+            '--sitemaps',
+            help='Specifies the dotted path to a dictionary of sitemaps, whose paths are '
+                 'regarded as working without rendering them. Defaults to linkcheck_config setting')
 
     def handle(self, *args, **options):
         limit = options.get('limit', None) or MAX_CHECKS_PER_RUN
+        max_duration = options.get('max_duration', None) or MAX_DURATION
+        processes = options.get('processes', None) or PROCESSES
+        workers = options.get('workers', None) or WORKERS
+        sitemaps = options.get('sitemaps', None) or SITEMAPS
 
         self.stdout.write("Checking all internal links.")
         if limit != -1:
             self.stdout.write(f"Will run maximum of {limit} checks this run.")
-
-        check_count = check_links(limit=limit, check_external=False)
+        if max_duration:
+            self.stdout.write(f"Will stop checking after {max_duration} seconds.")
+
+        check_count = check_links(
+            limit=limit,
+            check_external=False,
+            max_duration=max_duration,
+            processes=processes,
+            workers=workers,
+            sitemaps=sitemaps,
+        )
         return f"{check_count} internal URLs have been checked."
@@ -1,8 +1,14 @@
+import time
+
 from django.core.management.base import BaseCommand
 
+from linkcheck.engines import ENGINES
 from linkcheck.linkcheck_settings import (
-    EXTERNAL_RECHECK_INTERVAL,
+    ENGINE,
     MAX_CHECKS_PER_RUN,
+    MAX_DURATION,
+    PROCESSES,
+    WORKERS,
 )
 from linkcheck.utils import check_links
 
@@ -15,22 +21,65 @@ class Command(BaseCommand):
         parser.add_argument(
             '-e', '--externalinterval', type=int,
             help='Specifies the length of time in minutes until external links are rechecked. '
-                 'Defaults to linkcheck_config setting'
+                 'By default, they are rechecked when they are due (see linkcheck_config setting)'
         )
         parser.add_argument(
             '-l', '--limit', type=int,
             help='Specifies the maximum number (int) of links to be checked. '
                  'Defaults to linkcheck_config setting.  Value less than 1 will check all'
         )
+        parser.add_argument(
+            '-d', '--max-duration', type=int,
+            help='Specifies the maximum duration in seconds of the run, after which no more links are checked. '
+                 'Defaults to linkcheck_config setting'
+        )
+        parser.add_argument(
+            '-w', '--workers', type=int,
+            help='Specifies the number of links which are checked in parallel by threads. '
+                 'Defaults to linkcheck_config setting'
+        )
+        parser.add_argument(
+            '-p', '--processes', type=int,
+            help='Specifies the number of processes in which internal links are checked in parallel. '
+                 'Defaults to linkcheck_config setting'
+        )
+        parser.add_argument(
+            '--engine', choices=list(ENGINES),
+            help='Specifies the engine used to check external links in parallel. '
+                 'Defaults to linkcheck_config setting'
+        )
 
     def handle(self, *args, **options):
-        externalinterval = options['externalinterval'] or EXTERNAL_RECHECK_INTERVAL
+        externalinterval = options['externalinterval']
+        workers = options['workers'] or WORKERS
+        processes = options['processes'] or PROCESSES
+        engine = options['engine'] or ENGINE
         limit = options['limit'] or MAX_CHECKS_PER_RUN
+        max_duration = options['max_duration'] or MAX_DURATION
 
-        self.stdout.write(f"Checking all links that haven't been tested for {externalinterval} minutes.")
+        if externalinterval is not None:
+            self.stdout.write(f"Checking all links that haven't been tested for {externalinterval} minutes.")
+        else:
+            self.stdout.write("Checking all internal links and the external links which are due for a recheck.")
         if limit != -1:
             self.stdout.write(f"Will run maximum of {limit} checks this run.")
+        if max_duration:
+            self.stdout.write(f"Will stop checking after {max_duration} seconds.")
 
-        internal_checked = check_links(limit=limit, check_external=False)
-        external_checked = check_links(external_recheck_interval=externalinterval, limit=limit, check_internal=False)
+        started = time.monotonic()
+        internal_checked = check_links(
+            limit=limit, check_external=False, max_duration=max_duration, processes=processes, workers=workers
+        )
+        if max_duration:
+            # The external links are checked in the remaining time
+            max_duration = max(max_duration - (time.monotonic() - started), 0)
+        external_checked = check_links(
+            # By default, the URLs are rechecked at their next_check_at date
+            external_recheck_interval=externalinterval,
+            limit=limit,
+            check_internal=False,
+            workers=workers,
+            engine=engine,
+            max_duration=max_duration,
+        )
         return f"{internal_checked} internal URLs and {external_checked} external URLs have been checked."
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from linkcheck.utils import classify_urls
+
+
+class Command(BaseCommand):
+
+    help = "Update the classification (type, internal or external, host) of all recorded URLs"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Classifying all URLs...")
+        return f"{classify_urls()} URLs have been reclassified."
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkcheck', '0012_url_add_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Host',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('use_get', models.BooleanField(default=False)),
+                ('use_fallback_user_agent', models.BooleanField(default=False)),
+                ('skip_ssl_verification', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkcheck', '0013_host'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='url',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
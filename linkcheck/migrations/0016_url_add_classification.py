@@ -0,0 +1,108 @@
+import re
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def get_internal_url(url, external_regex):
+    """
+    Return the URL without the domain of the site, or None for external URLs
+    (a copy of `Url.internal_url` at the time of this migration)
+    """
+    if not external_regex.match(url):
+        return url
+    internal_exceptions = []
+    site_domains = getattr(settings, 'LINKCHECK_SITE_DOMAINS', [])
+    if site_domains:
+        internal_exceptions = site_domains
+    elif getattr(settings, 'SITE_DOMAIN', None):
+        root_domain = settings.SITE_DOMAIN
+        if root_domain.startswith('www.'):
+            root_domain = root_domain[4:]
+        elif root_domain.startswith('test.'):
+            root_domain = root_domain[5:]
+        internal_exceptions = [
+            f'{protocol}://{sub}{root_domain}' for sub in ['', 'www.', 'test.'] for protocol in ['http', 'https']
+        ]
+    for ex in internal_exceptions:
+        if ex and url.startswith(ex):
+            url = url.replace(ex, '', 1)
+    return None if external_regex.match(url) else url
+
+
+def get_classification(url, external_regex, media_prefix):
+    """
+    Return the values of the classification fields of `url`
+    (a copy of `Url.get_classification()` at the time of this migration)
+    """
+    internal_url = get_internal_url(url, external_regex)
+    if internal_url is None:
+        url_type = 'external'
+    elif url.startswith('mailto:'):
+        url_type = 'mailto'
+    elif url.startswith('tel:'):
+        url_type = 'phone'
+    elif internal_url == '':
+        url_type = 'empty'
+    elif internal_url.startswith('#'):
+        url_type = 'anchor'
+    elif internal_url.startswith(media_prefix):
+        url_type = 'file'
+    elif internal_url.startswith('/'):
+        url_type = 'internal'
+    else:
+        url_type = 'invalid'
+    return {
+        'url_type': url_type,
+        'is_external': internal_url is None,
+        'host_name': urlparse(url).hostname or '' if internal_url is None else '',
+        'is_anchored': '#' in url,
+    }
+
+
+def classify_urls(apps, schema_editor):
+    Url = apps.get_model('linkcheck', 'Url')
+    external_regex = re.compile(getattr(settings, 'LINKCHECK_EXTERNAL_REGEX_STRING', r'^https?://'))
+    media_prefix = getattr(settings, 'LINKCHECK_MEDIA_PREFIX', settings.MEDIA_URL)
+    fields = ['url_type', 'is_external', 'host_name', 'is_anchored']
+    urls = []
+    for url in Url.objects.only('id', 'url').iterator(chunk_size=1000):
+        for field, value in get_classification(url.url, external_regex, media_prefix).items():
+            setattr(url, field, value)
+        urls.append(url)
+        if len(urls) == 1000:
+            Url.objects.bulk_update(urls, fields)
+            urls = []
+    Url.objects.bulk_update(urls, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkcheck', '0015_url_next_check_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='url',
+            name='url_type',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='url',
+            name='is_external',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='url',
+            name='host_name',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='url',
+            name='is_anchored',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(classify_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkcheck', '0016_url_add_classification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='host',
+            name='learned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkcheck', '0017_host_learned_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='url',
+            name='last_checked',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
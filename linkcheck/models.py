@@ -1,22 +1,28 @@
 import logging
 import os.path
+import random
 import re
-from datetime import timedelta
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from http import HTTPStatus
-from urllib.parse import unquote, urlparse
+from urllib.parse import unquote, urlparse, urlsplit
 
 import requests
+from django.apps import apps
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldError, ValidationError
 from django.db import models
-from django.test.client import Client
-from django.test.utils import modify_settings
+from django.urls import Resolver404, resolve
 from django.utils.encoding import iri_to_uri
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
-from requests.exceptions import ConnectionError, ReadTimeout
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import NewConnectionError
 
 try:
     from reversion.revisions import revision_context_manager
@@ -26,12 +32,19 @@ except ImportError:
     USE_REVERSION = False
 
 from .linkcheck_settings import (
+    ANCHOR_MAX_BYTES,
     EXTERNAL_RECHECK_INTERVAL,
     EXTERNAL_REGEX_STRING,
+    HOST_STRATEGY_TTL,
     LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT,
+    MAX_RECHECK_INTERVAL,
     MAX_URL_LENGTH,
     MEDIA_PREFIX,
+    POOL_CONNECTIONS,
+    POOL_MAXSIZE,
     PROXIES,
+    RECHECK_JITTER,
+    RESOLVE_URLS,
     SITE_DOMAINS,
     TOLERATE_BROKEN_ANCHOR,
     TRUST_PROXY_SSL,
@@ -55,10 +68,85 @@ def html_decode(s):
 
 
 STATUS_CODE_CHOICES = [(s.value, f"{s.value} {s.phrase}") for s in HTTPStatus]
+# The fields of Url which hold the result of a check
+RESULT_FIELDS = [
+    "status",
+    "status_code",
+    "redirect_status_code",
+    "redirect_to",
+    "ssl_status",
+    "anchor_status",
+    "message",
+    "error_message",
+    "etag",
+    "last_modified",
+]
+# The fields of Url which are written after a check
+UPDATE_FIELDS = RESULT_FIELDS + ["last_checked", "next_check_at"]
+# A compact copy of the UPDATE_FIELDS of a Url, kept while it is checked
+Result = namedtuple("Result", UPDATE_FIELDS)
+# The fields of Url which hold its classification, see `Url.classify()`
+CLASSIFICATION_FIELDS = ["url_type", "is_external", "host_name", "is_anchored"]
 DEFAULT_USER_AGENT = f"{settings.SITE_DOMAIN} Linkchecker"
 FALLBACK_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
 )
+# Size of the parts in which documents are read for the anchor check
+ANCHOR_CHUNK_SIZE = 16 * 1024
+
+
+def get_session(pool_maxsize=None):
+    """
+    Return a requests session which keeps connections alive between requests.
+    The adapter holds one connection pool per host, so checking many URLs on the
+    same host reuses the existing TCP/TLS connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize or POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_resolve_only_content_types():
+    """
+    Return the content types of the models whose `Linklist` has `resolve_only` set
+    """
+    linklists = apps.get_app_config("linkcheck").all_linklists.values()
+    return [linklist.content_type() for linklist in linklists if linklist.resolve_only]
+
+
+class InternalResponse:
+    """
+    The response to an internal URL, which can be shared by all URLs of the same page.
+    The anchors of the page are only parsed once.
+    """
+
+    def __init__(self, status_code, content, redirect_to="", redirect_status_code=None):
+        self.status_code = status_code
+        self.content = content
+        self.redirect_to = redirect_to
+        self.redirect_status_code = redirect_status_code
+        self.anchors = None
+        self.parse_error = None
+
+    def load_anchors(self):
+        from linkcheck import parse_anchors
+
+        if self.anchors is None and self.parse_error is None:
+            try:
+                self.anchors = set(parse_anchors(self.content))
+            except Exception as e:
+                # Raised again by `find_anchor()`, so `check_anchor()` reports it for each URL
+                self.parse_error = e
+            # Only the anchors are needed any more
+            self.content = None
+
+    def find_anchor(self, anchor):
+        self.load_anchors()
+        if self.parse_error is not None:
+            raise self.parse_error
+        return anchor in self.anchors
 
 
 class Url(models.Model):
@@ -69,7 +157,10 @@ class Url(models.Model):
 
     # See http://www.boutell.com/newfaq/misc/urllength.html
     url = models.CharField(max_length=MAX_URL_LENGTH, unique=True)
-    last_checked = models.DateTimeField(blank=True, null=True)
+    # Indexed for the order of the checks, see `linkcheck.utils.get_check_queue()`
+    last_checked = models.DateTimeField(blank=True, null=True, db_index=True)
+    # When an external URL is due for a recheck, see `get_next_check_at()`
+    next_check_at = models.DateTimeField(blank=True, null=True, db_index=True)
     anchor_status = models.BooleanField(null=True)
     ssl_status = models.BooleanField(null=True)
     status = models.BooleanField(null=True)
@@ -78,6 +169,43 @@ class Url(models.Model):
     message = models.CharField(max_length=1024, blank=True, null=True)
     error_message = models.CharField(max_length=1024, default="", blank=True)
     redirect_to = models.TextField(blank=True)
+    # Validators of the last successful response, to revalidate it with a conditional request
+    etag = models.CharField(max_length=255, default="", blank=True)
+    last_modified = models.CharField(max_length=64, default="", blank=True)
+    # Until when the URL is claimed by a process checking it, see `linkcheck.utils.claim_urls()`
+    lease_expires = models.DateTimeField(blank=True, null=True)
+    # The classification of the URL, stored to filter URLs in the database
+    url_type = models.CharField(max_length=16, blank=True, db_index=True)
+    is_external = models.BooleanField(default=False, db_index=True)
+    host_name = models.CharField(max_length=255, blank=True, db_index=True)
+    is_anchored = models.BooleanField(default=False)
+
+    # Not stored, only used to schedule retries of rate limited URLs and to skip unreachable hosts
+    retry_after = None
+    host_unreachable = False
+    timed_out = False
+    # The result as loaded from the database, to only write what a check changed
+    saved_result = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if set(UPDATE_FIELDS).issubset(field_names):
+            instance.saved_result = instance.get_result()
+        return instance
+
+    def get_result(self):
+        return Result._make(getattr(self, field) for field in UPDATE_FIELDS)
+
+    @property
+    def result_changed(self):
+        """
+        Whether the result differs from the saved one, apart from the date of the check
+        """
+        return (
+            self.saved_result is None
+            or self.get_result()[:len(RESULT_FIELDS)] != self.saved_result[:len(RESULT_FIELDS)]
+        )
 
     @property
     def redirect_ok(self):
@@ -253,6 +381,32 @@ class Url(models.Model):
         """
         return not self.internal
 
+    def get_classification(self):
+        """
+        Return the values of the classification fields, which depend on the URL and on
+        the SITE_DOMAINS (or SITE_DOMAIN) and LINKCHECK_MEDIA_PREFIX settings
+        """
+        # The properties are cached, but the URL may have changed
+        self.__dict__.pop("internal_url", None)
+        self.__dict__.pop("external_url", None)
+        return {
+            "url_type": self.type,
+            "is_external": self.external,
+            "host_name": urlparse(self.external_url).hostname or "" if self.external else "",
+            "is_anchored": self.has_anchor,
+        }
+
+    def classify(self):
+        for field, value in self.get_classification().items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.classify()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "url" in update_fields:
+            kwargs["update_fields"] = {*update_fields, *CLASSIFICATION_FIELDS}
+        super().save(*args, **kwargs)
+
     def reset_for_check(self):
         """
         Reset all fields which depend on the status after checking a URL.
@@ -266,25 +420,47 @@ class Url(models.Model):
         self.ssl_status = None
         self.error_message = ""
         self.message = ""
-
-    def check_url(self, check_internal=True, check_external=True, external_recheck_interval=EXTERNAL_RECHECK_INTERVAL):
+        self.etag = ""
+        self.last_modified = ""
+        self.retry_after = None
+        self.host_unreachable = False
+        self.timed_out = False
+
+    def check_url(
+        self,
+        check_internal=True,
+        check_external=True,
+        external_recheck_interval=None,
+        session=None,
+        internal_responses=None,
+        commit=True,
+        internal_client=None,
+    ):
         """
         Return:
          * True if the link was checked and found valid
          * False if the link was checked and found invalid
          * None if the link was not checked
+
+        With `commit=False`, the result is not saved to the database.
+        Internal URLs are requested with `internal_client`, see `check_internal()`.
         """
 
         if check_internal and self.internal:
-            return self.check_internal()
+            return self.check_internal(internal_responses, commit=commit, client=internal_client)
         elif check_external and self.external:
-            return self.check_external(external_recheck_interval)
+            return self.check_external(external_recheck_interval, session=session, commit=commit)
         else:
             return None
 
-    def check_internal(self):
+    def check_internal(self, responses=None, commit=True, client=None):
         """
         Check an internal URL
+
+        `responses` is a dictionary in which the responses to pages with anchors are kept
+        during a run, so a page linked with different anchors is only requested once.
+        With `commit=False`, the result is not saved to the database.
+        `client` is a `linkcheck.utils.InternalClient` which is reused during a run.
         """
         if not self.internal:
             logger.info("URL %r is not internal", self)
@@ -295,8 +471,6 @@ class Url(models.Model):
         # Reset all fields in case they were already set
         self.reset_for_check()
 
-        from linkcheck.utils import LinkCheckHandler
-
         if self.type == "empty":
             self.status = False
             self.message = "Empty link"
@@ -319,37 +493,44 @@ class Url(models.Model):
             self.message = "Working file link" if self.status else "Missing Document"
 
         elif self.type == "internal":
-            old_prepend_setting = settings.PREPEND_WWW
-            settings.PREPEND_WWW = False
-            c = Client()
-            c.handler = LinkCheckHandler()
-            with modify_settings(ALLOWED_HOSTS={"append": "testserver"}):
-                response = c.get(self.internal_url)
+            path = self.internal_url.split("#")[0]
+            response = responses.get(path) if responses is not None else None
+            if response is None and client is not None and not self.has_anchor and client.is_valid_path(path):
+                # Listed in the sitemaps
+                response = InternalResponse(200, b"")
+            if response is None:
+                response = self.get_resolved_response()
+            if response is None:
+                response = self.get_internal_response(client)
+                if responses is not None and self.has_anchor:
+                    # The anchors are parsed before the response is shared with other threads,
+                    # which would otherwise find its content cleared while parsing it
+                    response.load_anchors()
+                    responses[path] = response
+
             self.status_code = response.status_code
             if response.status_code < 300:
                 self.message = "Working internal link"
                 self.status = True
             elif response.status_code < 400:
-                initial_location = response.get("Location")
                 redirect_type = "permanent" if response.status_code == 301 else "temporary"
-                with modify_settings(ALLOWED_HOSTS={"append": "testserver"}):
-                    response = c.get(self.internal_url, follow=True)
-                if response.redirect_chain:
-                    self.redirect_to, _ = response.redirect_chain[-1]
+                self.redirect_to = response.redirect_to
+                self.redirect_status_code = response.redirect_status_code
+                if response.redirect_status_code is None:
+                    # The external URL is not requested
+                    self.status = True
+                    self.message = f"Working {redirect_type} redirect to an external URL"
                 else:
-                    self.redirect_to = initial_location
-                self.redirect_status_code = response.status_code
-                self.status = response.status_code < 300
-                redirect_result = "Working" if self.status else "Broken"
-                self.message = f"{redirect_result} {redirect_type} redirect"
+                    self.status = response.redirect_status_code < 300
+                    redirect_result = "Working" if self.status else "Broken"
+                    self.message = f"{redirect_result} {redirect_type} redirect"
             else:
                 self.status = False
                 self.message = "Broken internal link"
 
-            # Check the anchor (if it exists)
-            self.check_anchor(response.content)
-
-            settings.PREPEND_WWW = old_prepend_setting
+            # Check the anchor (if it exists), except on an external page
+            if not (300 <= response.status_code < 400 and response.redirect_status_code is None):
+                self.check_anchor(response)
         else:
             self.status = False
             self.message = "Invalid URL"
@@ -359,119 +540,371 @@ class Url(models.Model):
             revision_context_manager.start()
 
         self.last_checked = now()
-        self.save()
+        if commit:
+            self.save()
         return self.status
 
-    def check_external(self, external_recheck_interval=EXTERNAL_RECHECK_INTERVAL):
+    def get_resolved_response(self):
+        """
+        Validate an internal URL by resolving its path, without rendering the page,
+        when its URL pattern name is a key of `LINKCHECK_RESOLVE_URLS` or when it is
+        linked from objects of a `Linklist` with `resolve_only` set.
+        If the pattern name is mapped to a model ("app_label.ModelName"), an object
+        matching the keyword arguments of the URL must exist as well.
+
+        Return None when the page has to be rendered: URLs with anchors, paths which
+        don't resolve and URLs which match no rule.
+        """
+        if self.has_anchor:
+            return None
+        content_types = get_resolve_only_content_types()
+        if not RESOLVE_URLS and not content_types:
+            return None
+        try:
+            match = resolve(unquote(urlsplit(self.internal_url).path))
+        except Resolver404:
+            return None
+
+        model = None
+        if match.view_name in RESOLVE_URLS:
+            model = RESOLVE_URLS[match.view_name]
+        elif not (self.pk and content_types and self.links.filter(content_type__in=content_types).exists()):
+            return None
+
+        if model is not None:
+            model = apps.get_model(model)
+            try:
+                exists = model._default_manager.filter(**match.kwargs).exists()
+            except FieldError:
+                logger.warning(
+                    "The arguments of the URL pattern %s are not fields of %s, its pages are rendered",
+                    match.view_name,
+                    model.__name__,
+                )
+                return None
+            except (ValueError, ValidationError):
+                exists = False
+            if not exists:
+                return InternalResponse(404, b"")
+        return InternalResponse(200, b"")
+
+    def get_internal_response(self, client=None):
+        """
+        Request the page of an internal URL with the test client, following its redirects
+        without requesting the page itself a second time
+
+        Pass a `linkcheck.utils.InternalClient` as `client` to reuse it across checks.
+        """
+        if client is None:
+            from linkcheck.utils import InternalClient
+
+            client = InternalClient()
+
+        response = client.get(self.internal_url)
+        redirect_to = ""
+        redirect_status_code = None
+        if 300 <= response.status_code < 400:
+            initial_location = response.get("Location")
+            status_code = response.status_code
+            response = client.follow(response)
+            if response.redirect_chain:
+                redirect_to, _ = response.redirect_chain[-1]
+            else:
+                redirect_to = initial_location
+            if 300 <= response.status_code < 400 and client.get_local_path(redirect_to) is None:
+                # Redirected to another host, which is not requested
+                redirect_status_code = None
+            else:
+                redirect_status_code = response.status_code
+        else:
+            status_code = response.status_code
+        return InternalResponse(status_code, response.content, redirect_to, redirect_status_code)
+
+    def get_validators(self):
+        """
+        Return the headers of a conditional request which revalidates the last check,
+        if that check was successful and its response contained validators.
+        """
+        if not self.status or self.redirect_to:
+            return {}
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def recently_checked(self, external_recheck_interval=None):
+        """
+        Check whether this URL was checked during the last `external_recheck_interval` minutes,
+        or by default, whether its `next_check_at` date is not reached yet
+        """
+        if external_recheck_interval is None:
+            if self.next_check_at:
+                return self.next_check_at > now()
+            external_recheck_interval = EXTERNAL_RECHECK_INTERVAL
+        external_recheck_datetime = now() - timedelta(minutes=external_recheck_interval)
+        return bool(self.last_checked and (self.last_checked > external_recheck_datetime))
+
+    def check_external(
+        self,
+        external_recheck_interval=None,
+        session=None,
+        commit=True,
+        followers=(),
+        host=None,
+    ):
         """
         Check an external URL
+
+        Pass a session from `get_session()` to reuse its connections across checks,
+        otherwise a session is opened just for this URL.
+        With `commit=False`, the result is not saved to the database.
+        `followers` are other URLs of the same document with different anchors. They are
+        checked with the same requests and get the same result, apart from their anchor.
+        `host` is the `Host` of the URL: the check starts with the requests which worked for
+        it before, and what is learned about the host is recorded in it (without saving it).
         """
+        from linkcheck import AnchorFinder
+
         if not self.external:
             logger.info("URL %r is not external", self)
             return None
 
+        if self.recently_checked(external_recheck_interval):
+            logger.debug("URL was checked recently, so not checking it again")
+            return self.status
+
+        if session is None:
+            with get_session() as session:
+                return self.check_external(
+                    external_recheck_interval, session=session, commit=commit, followers=followers, host=host
+                )
+
         logger.info("checking external link: %s", self.url)
-        external_recheck_datetime = now() - timedelta(minutes=external_recheck_interval)
+        urls = [self, *followers]
 
-        if self.last_checked and (self.last_checked > external_recheck_datetime):
-            logger.debug(
-                "URL was last checked in the last %s minutes, so not checking it again", external_recheck_interval
-            )
-            return self.status
+        # Keep the last results in case the response is "304 Not Modified"
+        validators = get_common_validators(urls)
+        previous_results = [
+            {field: getattr(url, field) for field in RESULT_FIELDS} if validators else None for url in urls
+        ]
 
         # Reset all fields in case they were already set
-        self.reset_for_check()
+        for url in urls:
+            url.reset_for_check()
 
+        has_anchor = any(url.has_anchor for url in urls)
+        host = host or Host()
         request_params = {
             "allow_redirects": True,
-            "headers": {"User-Agent": DEFAULT_USER_AGENT},
+            "headers": {"User-Agent": host.user_agent, **validators},
             "timeout": LINKCHECK_CONNECTION_ATTEMPT_TIMEOUT,
-            "verify": True,
+            "verify": not host.skip_ssl_verification,
         }
         if PROXIES:
-            request_params["verify"] = not TRUST_PROXY_SSL
+            request_params["verify"] = not TRUST_PROXY_SSL and request_params["verify"]
             request_params["proxies"] = PROXIES
 
+        ssl_status = None
+        error = None
+        host_unreachable = timed_out = False
         try:
             try:
-                # At first try a HEAD request
-                fetch = requests.head
+                # At first try a HEAD request, unless the host does not allow it
+                fetch = session.get if host.use_get else session.head
+                request_params["stream"] = host.use_get and has_anchor
                 response = fetch(self.external_url, **request_params)
-                # If no exceptions occur, the SSL certificate is valid
-                if self.external_url.startswith("https://"):
-                    self.ssl_status = True
+                # If no exceptions occur, the SSL certificate is valid, if it was verified
+                if self.external_url.startswith("https://") and request_params["verify"]:
+                    ssl_status = True
             except ConnectionError as e:
                 # This error could also be caused by an incomplete root certificate bundle,
                 # so let's retry without verifying the certificate
                 if "unable to get local issuer certificate" in str(e):
                     request_params["verify"] = False
                     response = fetch(self.external_url, **request_params)
+                    host.learn(skip_ssl_verification=True)
                 else:
                     # Re-raise exception if it's definitely not a false positive
                     raise
             # If HEAD is not allowed, let's try with GET
-            if response.status_code in [HTTPStatus.BAD_REQUEST, HTTPStatus.METHOD_NOT_ALLOWED]:
+            if fetch == session.head and response.status_code in [
+                HTTPStatus.BAD_REQUEST,
+                HTTPStatus.METHOD_NOT_ALLOWED,
+            ]:
                 logger.debug("HEAD is not allowed, retry with GET")
-                fetch = requests.get
+                fetch = session.get
+                request_params["stream"] = has_anchor
                 response = fetch(self.external_url, **request_params)
+                if response.status_code not in [HTTPStatus.BAD_REQUEST, HTTPStatus.METHOD_NOT_ALLOWED]:
+                    host.learn(use_get=True)
             # If access is denied, possibly the user agent is blocked
-            if response.status_code == HTTPStatus.FORBIDDEN:
+            if response.status_code == HTTPStatus.FORBIDDEN and not host.use_fallback_user_agent:
                 logger.debug("Forbidden, retry with different user agent")
                 request_params["headers"] = {"User-Agent": FALLBACK_USER_AGENT}
                 response = fetch(self.external_url, **request_params)
+                if response.status_code != HTTPStatus.FORBIDDEN:
+                    host.learn(use_fallback_user_agent=True)
             # If URL contains hash anchor and is a valid HTML document, let's repeat with GET
             elif (
-                self.has_anchor
+                has_anchor
                 and response.ok
-                and fetch == requests.head
+                and response.status_code != HTTPStatus.NOT_MODIFIED
+                and fetch == session.head
                 and "text/html" in response.headers.get("content-type")
             ):
                 logger.debug("Retrieve content for anchor check")
-                fetch = requests.get
+                fetch = session.get
+                request_params["stream"] = True
                 response = fetch(self.external_url, **request_params)
+            content = None
+            if fetch == session.get and has_anchor:
+                # Read the document only until the anchors are found
+                content = AnchorFinder(
+                    [url.anchor for url in urls], response.headers.get("content-type", ""), ANCHOR_MAX_BYTES
+                )
+                with response:
+                    for chunk in response.iter_content(ANCHOR_CHUNK_SIZE):
+                        if content.feed_bytes(chunk):
+                            break
         except ReadTimeout:
-            self.status = False
-            self.message = "Other Error: The read operation timed out"
-            self.error_message = "The read operation timed out"
+            error = ("Other Error: The read operation timed out", "The read operation timed out")
+            timed_out = True
         except ConnectionError as e:
-            self.status = False
-            self.message = self.error_message = format_connection_error(e)
+            error = (format_connection_error(e),) * 2
+            timed_out = isinstance(e, ConnectTimeout)
             if "SSLError" in str(e):
-                self.ssl_status = False
+                ssl_status = False
+            # The name of the host could not be resolved or the connection was refused
+            host_unreachable = isinstance(getattr(e.args[0], "reason", None), NewConnectionError) if e.args else False
         except Exception as e:
-            self.status = False
-            self.message = f"Other Error: {e}"
-            self.error_message = str(e)
-        else:
-            self.status = response.status_code < 300
-            self.message = f"{response.status_code} {response.reason}"
-            logger.debug("Response message: %s", self.message)
-
-            # If initial response was a redirect, return the initial return code
-            if response.history:
-                logger.debug("Redirect history: %r", response.history)
-                if response.ok:
-                    self.message = f"{response.history[0].status_code} {response.history[0].reason}"
-                self.redirect_to = response.url
-                self.redirect_status_code = response.status_code
-                self.status_code = response.history[0].status_code
+            error = (f"Other Error: {e}", str(e))
+
+        for url, previous_result in zip(urls, previous_results):
+            url.ssl_status = ssl_status
+            if error:
+                url.status = False
+                url.message, url.error_message = error
+                url.host_unreachable = host_unreachable
+                url.timed_out = timed_out
             else:
-                self.status_code = response.status_code
+                url.record_external_response(
+                    response.status_code,
+                    response.reason,
+                    history=[(r.status_code, r.reason) for r in response.history],
+                    final_url=response.url,
+                    content=content,
+                    verified=request_params["verify"],
+                    headers=response.headers,
+                    previous_result=previous_result,
+                )
+        for url in followers:
+            url.finish_external_check(commit=commit)
+        return self.finish_external_check(commit=commit)
+
+    def record_external_response(
+        self,
+        status_code,
+        reason,
+        history=(),
+        final_url="",
+        content=None,
+        verified=True,
+        headers=None,
+        previous_result=None,
+    ):
+        """
+        Record the final response of an external check.
+        `history` holds the (status code, reason) of each redirect which was followed,
+        `content` is the response body if it was retrieved for the anchor check and
+        `headers` are the (case-insensitive) response headers.
+        `previous_result` is the result of the last check if it was revalidated.
+        """
+        headers = headers or {}
+        self.retry_after = parse_retry_after(headers.get("Retry-After"))
+
+        if status_code == HTTPStatus.NOT_MODIFIED and not history and previous_result:
+            logger.debug("Not modified since the last check, keep its result")
+            for field, value in previous_result.items():
+                setattr(self, field, value)
+            self.etag = headers.get("ETag", self.etag)
+            self.last_modified = headers.get("Last-Modified", self.last_modified)
+            return
+
+        self.status = status_code < 300
+        self.message = f"{status_code} {reason}"
+        logger.debug("Response message: %s", self.message)
+
+        # If initial response was a redirect, return the initial return code
+        if history:
+            logger.debug("Redirect history: %r", history)
+            if status_code < 400:
+                self.message = f"{history[0][0]} {history[0][1]}"
+            self.redirect_to = final_url
+            self.redirect_status_code = status_code
+            self.status_code = history[0][0]
+        else:
+            self.status_code = status_code
+
+        # Check the anchor (if it exists)
+        if content is not None:
+            self.check_anchor(content)
+        if not verified:
+            self.message += ", SSL certificate could not be verified"
+
+        # Keep the validators of successful responses for the next check
+        if self.status and not history:
+            etag = headers.get("ETag", "")
+            self.etag = etag if len(etag) <= self._meta.get_field("etag").max_length else ""
+            self.last_modified = headers.get("Last-Modified", "")[:64]
 
-            # Check the anchor (if it exists)
-            if fetch == requests.get:
-                self.check_anchor(response.text)
-            if not request_params["verify"]:
-                self.message += ", SSL certificate could not be verified"
+    def record_host_error(self, message, error_message):
+        """
+        Record the connection error of an unreachable host without checking this URL
+        """
+        self.reset_for_check()
+        self.status = False
+        self.message = message
+        self.error_message = error_message
 
+    def finish_external_check(self, commit=True):
+        """
+        Set the date of the check and save the result unless `commit` is False
+        """
         # When a rate limit was hit or the server returned an internal error, do not update
         # the last_checked date so the result is not cached for EXTERNAL_RECHECK_INTERVAL minutes
         if not self.status_code or self.status_code != HTTPStatus.TOO_MANY_REQUESTS and self.status_code < 500:
             self.last_checked = now()
-        self.save()
+            self.next_check_at = self.get_next_check_at()
+        if commit:
+            self.save()
         return self.status
 
+    def get_next_check_at(self):
+        """
+        Return the date of the next check of this URL, after it was checked.
+
+        The recheck interval starts at EXTERNAL_RECHECK_INTERVAL. It is doubled each time a working
+        URL is found unchanged, up to MAX_RECHECK_INTERVAL, and halved when the result changed.
+        A random jitter of RECHECK_JITTER spreads the rechecks of URLs which were checked together.
+        """
+        interval = EXTERNAL_RECHECK_INTERVAL
+        previous = self.saved_result
+        if previous and previous.last_checked:
+            if self.result_changed:
+                interval /= 2
+            elif self.status and previous.next_check_at:
+                last_interval = (previous.next_check_at - previous.last_checked) / timedelta(minutes=1)
+                interval = min(max(2 * last_interval, interval), MAX_RECHECK_INTERVAL)
+        interval *= random.uniform(1 - RECHECK_JITTER, 1 + RECHECK_JITTER)
+        return self.last_checked + timedelta(minutes=interval)
+
     def check_anchor(self, html):
+        """
+        Check the anchor of this URL in `html`, which is either the document or an object
+        looking up anchors in it with its `find_anchor()` method, like `AnchorFinder`
+        """
         from linkcheck import parse_anchors
 
         scope = "internal" if self.internal else "external"
@@ -484,7 +917,10 @@ class Url(models.Model):
                 self.message += f", working {scope} hash anchor"
             else:
                 try:
-                    names = parse_anchors(html)
+                    if isinstance(html, (str, bytes)):
+                        found = self.anchor in parse_anchors(html)
+                    else:
+                        found = html.find_anchor(self.anchor)
                 # Known possible errors include: AssertionError, NotImplementedError, UnicodeDecodeError
                 except Exception as e:
                     logger.debug("%s while parsing anchors: %s", type(e).__name__, e)
@@ -492,7 +928,11 @@ class Url(models.Model):
                     if not TOLERATE_BROKEN_ANCHOR:
                         self.status = False
                 else:
-                    if self.anchor in names:
+                    if found is None:
+                        self.message += ", document too large to check anchor"
+                        if not TOLERATE_BROKEN_ANCHOR:
+                            self.status = False
+                    elif found:
                         self.anchor_status = True
                         self.message += f", working {scope} hash anchor"
                     else:
@@ -542,6 +982,69 @@ class Link(models.Model):
         return f"<Link (id: {self.id}, url: {self.url!r}, source: {self.content_object!r})>"
 
 
+class Host(models.Model):
+    """
+    A Host records how the external URLs of a host name have to be requested,
+    so that later checks start with the requests which worked before
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    # HEAD requests are rejected with "400 Bad Request" or "405 Method Not Allowed"
+    use_get = models.BooleanField(default=False)
+    # The default user agent is blocked with "403 Forbidden"
+    use_fallback_user_agent = models.BooleanField(default=False)
+    # The certificate cannot be verified, e.g. because an intermediate certificate is missing
+    skip_ssl_verification = models.BooleanField(default=False)
+    # When the strategy was last changed
+    learned_at = models.DateTimeField(null=True, blank=True)
+
+    # Not stored, whether the strategy was updated since the host was loaded
+    changed = False
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<Host (id: {self.id}, name: {self.name})>"
+
+    @property
+    def user_agent(self):
+        return FALLBACK_USER_AGENT if self.use_fallback_user_agent else DEFAULT_USER_AGENT
+
+    def learn(self, **strategy):
+        """
+        Update the strategy without saving it, as this happens while URLs are checked
+        """
+        for field, value in strategy.items():
+            if getattr(self, field) != value:
+                setattr(self, field, value)
+                self.learned_at = now()
+                self.changed = True
+
+    def save_strategy(self):
+        """
+        Save the strategy, also when another process created the same host in the meantime
+        """
+        fields = ["use_get", "use_fallback_user_agent", "skip_ssl_verification", "learned_at"]
+        host, _ = Host.objects.update_or_create(
+            name=self.name, defaults={field: getattr(self, field) for field in fields}
+        )
+        self.pk = host.pk
+        self.changed = False
+
+    def expire(self, ttl=None):
+        """
+        Forget the strategy learned more than `ttl` seconds ago (`LINKCHECK_HOST_STRATEGY_TTL`),
+        so that the next checks find out again whether it is still needed, e.g. whether
+        the certificate can be verified by now
+        """
+        ttl = HOST_STRATEGY_TTL if ttl is None else ttl
+        if ttl and self.learned_at and self.learned_at < now() - timedelta(seconds=ttl):
+            self.use_get = self.use_fallback_user_agent = self.skip_ssl_verification = False
+            self.learned_at = None
+            self.changed = True
+
+
 def link_post_delete(sender, instance, **kwargs):
     try:
         # url.delete() => link.delete() => link_post_delete
@@ -555,6 +1058,37 @@ def link_post_delete(sender, instance, **kwargs):
         pass
 
 
+def parse_retry_after(value):
+    """
+    Return the number of seconds to wait according to a Retry-After header,
+    which contains either a number of seconds or a HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def get_common_validators(urls):
+    """
+    Return the headers of a conditional request which revalidates the last check
+    of all `urls`, or an empty dict if they cannot be revalidated together
+    """
+    validators = urls[0].get_validators()
+    if any(url.get_validators() != validators for url in urls[1:]):
+        return {}
+    return validators
+
+
 def format_connection_error(e):
     """
     Helper function to provide better readable output of connection errors
@@ -0,0 +1,235 @@
+import logging
+from collections import defaultdict, deque
+from http import HTTPStatus
+from time import monotonic
+from urllib.parse import urlparse
+
+from django.core.cache import cache
+
+from .linkcheck_settings import (
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_THRESHOLD,
+    DEAD_HOST_THRESHOLD,
+    DEAD_HOST_TTL,
+    HOST_CONCURRENCY,
+    HOST_DELAY,
+    MAX_RETRY_AFTER,
+)
+
+logger = logging.getLogger(__name__)
+
+# How often a rate limited URL is checked during a run
+MAX_ATTEMPTS = 3
+# Seconds to wait after a "429 Too Many Requests" response without Retry-After header
+DEFAULT_RETRY_AFTER = 60
+# Result of the URLs of hosts which timed out repeatedly
+CIRCUIT_BREAKER_MESSAGE = "Skipped: the host timed out repeatedly"
+
+
+def get_host(url):
+    return url.host_name or urlparse(url.external_url).hostname
+
+
+class HostScheduler:
+    """
+    Decide in which order external URLs are checked, in order to be polite to each host:
+
+    - at most `concurrency` URLs of the same host are checked at the same time
+    - checks on the same host start at least `delay` seconds after each other
+    - a host which answered with a rate limit is paused for the time given in its
+      Retry-After header, and the URL is checked again later in the run
+    - after `dead_host_threshold` URLs of a host in a row could not be checked because
+      its name could not be resolved or no connection could be established, the other
+      URLs of the host are not checked, but get the same error from `pop_skipped()`.
+      With `dead_host_ttl`, the host is remembered in the cache for so many seconds.
+    - after `circuit_breaker_threshold` timeouts in a row on a host, the circuit breaker
+      of the host opens: no URL of the host is checked for `circuit_breaker_cooldown`
+      seconds. Then a single URL is checked as a probe. If it times out as well, the
+      other URLs of the host are skipped for the run with `CIRCUIT_BREAKER_MESSAGE`,
+      otherwise the host is checked normally again.
+
+    URLs are queued per host and the hosts are served in turn, so concurrent checks
+    are spread over as many hosts as possible. URLs of a queued document (which only
+    differ by their anchor) are not queued again, but checked together with the
+    first URL of the document as its followers.
+    """
+
+    def __init__(
+        self,
+        concurrency=HOST_CONCURRENCY,
+        delay=HOST_DELAY,
+        max_retry_after=MAX_RETRY_AFTER,
+        dead_host_threshold=DEAD_HOST_THRESHOLD,
+        dead_host_ttl=DEAD_HOST_TTL,
+        circuit_breaker_threshold=CIRCUIT_BREAKER_THRESHOLD,
+        circuit_breaker_cooldown=CIRCUIT_BREAKER_COOLDOWN,
+    ):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.max_retry_after = max_retry_after
+        self.dead_host_threshold = dead_host_threshold
+        self.dead_host_ttl = dead_host_ttl
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_cooldown = circuit_breaker_cooldown
+        self.queues = {}
+        self.active = defaultdict(int)
+        self.ready_at = defaultdict(float)
+        self.attempts = defaultdict(int)
+        self.size = 0
+        # Followers of the queued URLs by document, and of the URLs being checked by URL
+        self.documents = {}
+        self.checking = {}
+        # Consecutive connection errors and the error of unreachable hosts
+        self.failures = defaultdict(int)
+        self.dead_hosts = {}
+        self.skipped = []
+        # Consecutive timeouts, and hosts whose circuit breaker is open or which are probed
+        self.timeouts = defaultdict(int)
+        self.open_breakers = set()
+        self.probing = set()
+
+    def __len__(self):
+        return self.size
+
+    def available(self, host):
+        if host in self.open_breakers or host in self.probing:
+            # Only a single probe is checked
+            return self.active[host] == 0
+        return self.active[host] < self.concurrency
+
+    def add(self, url):
+        error = self.get_host_error(get_host(url))
+        if error:
+            self.skipped.append((url, error))
+            return
+        if url.external_url in self.documents:
+            self.documents[url.external_url].append(url)
+            return
+        self.documents[url.external_url] = []
+        self.queues.setdefault(get_host(url), deque()).append(url)
+        self.size += 1
+
+    def get_host_error(self, host):
+        """
+        Return the (message, error message) of the last check of an unreachable host, or None
+        """
+        if host not in self.dead_hosts:
+            self.dead_hosts[host] = cache.get(get_cache_key(host)) if self.dead_host_ttl else None
+        return self.dead_hosts[host]
+
+    def pop_skipped(self):
+        """
+        Return the URLs of skipped hosts which were not checked, together with their error
+        """
+        skipped, self.skipped = self.skipped, []
+        return skipped
+
+    def get_followers(self, url):
+        """
+        Return the URLs which are checked together with `url`, after it was popped
+        """
+        return self.checking.get(url.url, [])
+
+    def pop(self):
+        """
+        Return the next URL which can be checked now, or None if all hosts are busy
+        """
+        now = monotonic()
+        for host in self.queues:
+            if self.available(host) and self.ready_at[host] <= now:
+                queue = self.queues.pop(host)
+                url = queue.popleft()
+                # Move the host to the end of the line
+                if queue:
+                    self.queues[host] = queue
+                self.size -= 1
+                self.active[host] += 1
+                self.ready_at[host] = now + self.delay
+                self.attempts[url.url] += 1
+                self.checking[url.url] = self.documents.pop(url.external_url)
+                if host in self.open_breakers:
+                    logger.debug("Probe %s with %s", host, url.url)
+                    self.open_breakers.discard(host)
+                    self.probing.add(host)
+                return url
+        return None
+
+    def wait_time(self):
+        """
+        Return the number of seconds until a queued URL can be checked,
+        or None if all hosts with queued URLs have checks in progress
+        """
+        now = monotonic()
+        waits = [self.ready_at[host] - now for host in self.queues if self.available(host)]
+        return max(min(waits), 0) if waits else None
+
+    def done(self, url):
+        """
+        Release the host of a checked URL. If the host asked to retry later,
+        the URL is queued again with its followers and True is returned.
+        """
+        host = get_host(url)
+        self.active[host] -= 1
+        followers = self.checking.pop(url.url, [])
+
+        if url.host_unreachable:
+            self.failures[host] += 1
+            if self.dead_host_threshold and self.failures[host] >= self.dead_host_threshold:
+                self.mark_dead(host, (url.message, url.error_message))
+        elif url.status_code is not None:
+            self.failures[host] = 0
+
+        if url.timed_out:
+            self.timeouts[host] += 1
+            if host in self.probing:
+                logger.info("%s timed out repeatedly, its other URLs are not checked", host)
+                self.probing.discard(host)
+                self.skip_host(host, (CIRCUIT_BREAKER_MESSAGE, CIRCUIT_BREAKER_MESSAGE))
+            elif (
+                self.circuit_breaker_threshold
+                and self.timeouts[host] >= self.circuit_breaker_threshold
+                and host not in self.open_breakers
+            ):
+                logger.info("%s timed out repeatedly, pause it for %s seconds", host, self.circuit_breaker_cooldown)
+                self.open_breakers.add(host)
+                self.ready_at[host] = max(self.ready_at[host], monotonic() + self.circuit_breaker_cooldown)
+        elif url.status_code is not None:
+            self.timeouts[host] = 0
+            self.probing.discard(host)
+
+        if url.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            retry_after = DEFAULT_RETRY_AFTER if url.retry_after is None else url.retry_after
+        elif url.status_code == HTTPStatus.SERVICE_UNAVAILABLE and url.retry_after is not None:
+            retry_after = url.retry_after
+        else:
+            return False
+        if retry_after > self.max_retry_after or self.attempts[url.url] >= MAX_ATTEMPTS:
+            return False
+
+        logger.debug("%s is rate limited, retry %s in %s seconds", host, url.url, retry_after)
+        self.ready_at[host] = max(self.ready_at[host], monotonic() + retry_after)
+        for u in [url, *followers]:
+            self.add(u)
+        return True
+
+    def mark_dead(self, host, error):
+        if self.get_host_error(host):
+            return
+        logger.info("%s is unreachable, its other URLs are not checked", host)
+        if self.dead_host_ttl:
+            cache.set(get_cache_key(host), error, self.dead_host_ttl)
+        self.skip_host(host, error)
+
+    def skip_host(self, host, error):
+        """
+        Do not check the other URLs of `host` during this run, but return them from `pop_skipped()`
+        """
+        self.dead_hosts[host] = error
+        for url in self.queues.pop(host, ()):
+            self.size -= 1
+            for u in [url, *self.documents.pop(url.external_url)]:
+                self.skipped.append((u, error))
+
+
+def get_cache_key(host):
+    return f"linkcheck:dead-host:{host}"
@@ -0,0 +1,14 @@
+from django.contrib.sitemaps import Sitemap
+
+from linkcheck.tests.sampleapp.models import Book
+
+
+class BookSitemap(Sitemap):
+
+    def items(self):
+        return Book.objects.order_by('pk')
+
+
+sitemaps = {
+    'books': BookSitemap,
+}
@@ -1,4 +1,5 @@
 import time
+from collections import Counter
 
 from django.core.exceptions import PermissionDenied
 from django.http import (
@@ -6,6 +7,10 @@ from django.http import (
     HttpResponsePermanentRedirect,
     HttpResponseRedirect,
 )
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import etag
+
+from .models import Book
 
 
 def http_response(request, code):
@@ -33,6 +38,17 @@ def http_redirect_to_404(request):
     return HttpResponsePermanentRedirect("/http/404/")
 
 
+rate_limited_paths = set()
+
+
+def http_rate_limit(request, retry_after, id):
+    # Only the first request of each path is rate limited
+    if request.path not in rate_limited_paths:
+        rate_limited_paths.add(request.path)
+        return HttpResponse("", status=429, headers={"Retry-After": retry_after})
+    return HttpResponse("")
+
+
 def timeout(request):
     time.sleep(2)
     return HttpResponse("")
@@ -42,6 +58,32 @@ def http_response_with_anchor(request):
     return HttpResponse("<html><body><h1 id='anchor'>Anchor</h1></body></html>")
 
 
+validated_paths = set()
+
+
+@etag(lambda request, id: '"v1"')
+def http_response_with_etag(request, id):
+    # The anchor is only contained in the first document of each path,
+    # so it is only found again if the recheck is answered with "304 Not Modified"
+    if request.method == 'GET' and request.path not in validated_paths:
+        validated_paths.add(request.path)
+        return http_response_with_anchor(request)
+    return HttpResponse("<html><body></body></html>")
+
+
+def http_response_with_large_anchor(request):
+    content = "<p>Lorem ipsum dolor sit amet</p>" * 3000
+    return HttpResponse(f"<html><body><h1 id='top'>Top</h1>{content}<h1 id='bottom'>Bottom</h1></body></html>")
+
+
+document_requests = Counter()
+
+
+def http_document(request, id):
+    document_requests[request.path] += 1
+    return HttpResponse("<html><body><h1 id='first'>First</h1><h2 id='second'>Second</h2></body></html>")
+
+
 def http_redirect_to_anchor(request):
     return HttpResponseRedirect("/http/anchor/")
 
@@ -52,3 +94,13 @@ def static_video(request):
 
 def static_video_forged_content_type(request):
     return HttpResponse(b'<![x02\x00\xa0\xcc', content_type='text/html')
+
+
+def book_detail(request, pk):
+    document_requests[request.path] += 1
+    book = get_object_or_404(Book, pk=pk)
+    return HttpResponse(f"<html><body><h1 id='title'>{book.title}</h1></body></html>")
+
+
+def book_print(request, book_id):
+    return book_detail(request, book_id)
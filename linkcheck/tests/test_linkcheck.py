@@ -1,22 +1,38 @@
+import multiprocessing
 import os
+import re
 import sys
 from datetime import datetime, timedelta
+from functools import partial
+from importlib import import_module
 from io import StringIO
+from unittest import skipIf
 from unittest.mock import patch
 
+import requests
 import requests_mock
 import urllib3
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db import connection
 from django.test import LiveServerTestCase, TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from requests.exceptions import ConnectionError
 
-from linkcheck.linkcheck_settings import MAX_URL_LENGTH
+from linkcheck import AnchorFinder
+from linkcheck.engines import AsyncEngine, ThreadEngine, aiohttp
+from linkcheck.linkcheck_settings import (
+    EXTERNAL_REGEX_STRING,
+    MAX_URL_LENGTH,
+    MEDIA_PREFIX,
+)
 from linkcheck.listeners import (
     disable_listeners,
     enable_listeners,
@@ -25,15 +41,51 @@ from linkcheck.listeners import (
     tasks_queue,
     unregister_listeners,
 )
-from linkcheck.models import Link, Url
+from linkcheck.models import (
+    UPDATE_FIELDS,
+    Host,
+    Link,
+    Result,
+    Url,
+    get_session,
+    parse_retry_after,
+)
+from linkcheck.scheduler import HostScheduler
+from linkcheck.utils import (
+    LinkCheckHandler,
+    ResultWriter,
+    check_internal_links_in_processes,
+    check_links,
+    claim_urls,
+    classify_urls,
+    get_check_queue,
+    get_sitemap_paths,
+)
 from linkcheck.views import get_jquery_min_js
 
+from .sampleapp.linklists import BookLinklist
 from .sampleapp.models import Author, Book, Journal, Page
+from .sampleapp.sitemaps import sitemaps
+from .sampleapp.views import document_requests
 
 
 @override_settings(ROOT_URLCONF='linkcheck.tests.urls')
 class InternalCheckTestCase(TestCase):
 
+    @override_settings(PREPEND_WWW=True)
+    def test_internal_client_reused(self):
+        for url in ['/http/200/', '/http/404/', '/http/redirect/301/']:
+            Url.objects.create(url=url)
+        load_middleware = LinkCheckHandler.load_middleware
+        with patch.object(LinkCheckHandler, 'load_middleware', autospec=True, side_effect=load_middleware) as load:
+            self.assertEqual(check_links(check_external=False), 3)
+        load.assert_called_once()
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('status_code', 'redirect_status_code')),
+            [(200, None), (404, None), (301, 200)],
+        )
+        self.assertTrue(settings.PREPEND_WWW)
+
     def test_internal_check_mailto(self):
         uv = Url(url="mailto:nobody")
         uv.check_url()
@@ -186,6 +238,126 @@ class InternalCheckTestCase(TestCase):
         self.assertEqual(uv.redirect_to, '/http/anchor/')
         self.assertEqual(uv.type, 'internal')
 
+    def test_internal_redirect_requested_once(self):
+        paths = []
+
+        def record_path(sender, environ, **kwargs):
+            paths.append(environ['PATH_INFO'])
+
+        request_started.connect(record_path)
+        try:
+            uv = Url(url="/http/redirect_to_404/")
+            uv.check_url()
+        finally:
+            request_started.disconnect(record_path)
+        self.assertEqual(paths, ['/http/redirect_to_404/', '/http/404/'])
+        self.assertEqual(uv.message, "Broken permanent redirect")
+        self.assertEqual(uv.get_status_code_display(), '301 Moved Permanently')
+        self.assertEqual(uv.get_redirect_status_code_display(), '404 Not Found')
+        self.assertEqual(uv.redirect_to, '/http/404/')
+
+    def test_internal_redirect_to_external_url(self):
+        paths = []
+
+        def record_path(sender, environ, **kwargs):
+            paths.append(environ['PATH_INFO'])
+
+        request_started.connect(record_path)
+        try:
+            uv = Url(url="/http/redirect_to_external/#anchor")
+            uv.check_url()
+        finally:
+            request_started.disconnect(record_path)
+        # The page with the same path on this site is not rendered
+        self.assertEqual(paths, ['/http/redirect_to_external/'])
+        self.assertEqual(uv.message, "Working temporary redirect to an external URL")
+        self.assertEqual(uv.status, True)
+        self.assertEqual(uv.anchor_status, None)
+        self.assertEqual(uv.get_status_code_display(), '302 Found')
+        self.assertEqual(uv.redirect_status_code, None)
+        self.assertEqual(uv.redirect_to, 'https://elsewhere.example.com/http/404/')
+
+    def test_internal_redirect_to_site_domain(self):
+        uv = Url(url="/http/redirect_to_site_domain/")
+        uv.check_url()
+        self.assertEqual(uv.message, "Broken temporary redirect")
+        self.assertEqual(uv.get_redirect_status_code_display(), '404 Not Found')
+        self.assertEqual(uv.redirect_to, 'http://www.localhost/http/404/?page=2')
+
+    def test_internal_redirect_loop(self):
+        uv = Url(url="/http/redirect_loop/")
+        uv.check_url()
+        self.assertEqual(uv.message, "Broken temporary redirect")
+        self.assertEqual(uv.get_redirect_status_code_display(), '302 Found')
+
+    @patch('linkcheck.models.RESOLVE_URLS', {'book_detail': 'sampleapp.Book'})
+    def test_internal_check_resolve_urls(self):
+        book = Book.objects.create(title='Book', description='')
+        document_requests.clear()
+        for url, status, status_code in [
+            (f'/book/{book.pk}/', True, 200),
+            (f'/book/{book.pk + 1}/', False, 404),
+            ('/http/200/', True, 200),
+        ]:
+            uv = Url(url=url)
+            uv.check_url()
+            self.assertEqual(uv.status, status)
+            self.assertEqual(uv.status_code, status_code)
+        self.assertEqual(document_requests, {})
+        # Anchors are only found by rendering the page
+        uv = Url(url=f'/book/{book.pk}/#title')
+        uv.check_url()
+        self.assertEqual(uv.anchor_message, 'Working anchor')
+        self.assertEqual(document_requests, {f'/book/{book.pk}/': 1})
+
+    @patch('linkcheck.models.RESOLVE_URLS', {'book_print': 'sampleapp.Book'})
+    def test_internal_check_resolve_urls_not_fields(self):
+        book = Book.objects.create(title='Book', description='')
+        document_requests.clear()
+        uv = Url(url=f'/book/{book.pk}/print/')
+        with self.assertLogs('linkcheck', 'WARNING'):
+            uv.check_url()
+        # The page is rendered instead
+        self.assertEqual(uv.status, True)
+        self.assertEqual(document_requests, {f'/book/{book.pk}/print/': 1})
+
+    @patch.object(BookLinklist, 'resolve_only', True)
+    def test_internal_check_resolve_only_linklist(self):
+        Book.objects.create(title='Book', description='<a href="/book/1000/">Missing</a>')
+        Author.objects.create(name='Author', website='/book/2000/')
+        document_requests.clear()
+        self.assertEqual(check_links(check_external=False), 2)
+        # The path resolves, the object is not looked up without a LINKCHECK_RESOLVE_URLS rule
+        self.assertTrue(Url.objects.get(url='/book/1000/').status)
+        self.assertFalse(Url.objects.get(url='/book/2000/').status)
+        self.assertEqual(document_requests, {'/book/2000/': 1})
+
+    def test_internal_check_sitemaps(self):
+        books = [Book.objects.create(title=title, description='') for title in ['First', 'Second']]
+        for url in [
+            f'/book/{books[0].pk}/',
+            f'/book/{books[1].pk}/',
+            f'/book/{books[1].pk}/#title',
+            '/book/1000/',
+        ]:
+            Url.objects.create(url=url)
+        document_requests.clear()
+        self.assertEqual(get_sitemap_paths(sitemaps), {f'/book/{books[0].pk}/', f'/book/{books[1].pk}/'})
+        out = StringIO()
+        call_command('checkinternal', sitemaps='linkcheck.tests.sampleapp.sitemaps.sitemaps', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[-1], "4 internal URLs have been checked.")
+        # Only the URL with an anchor and the unknown path are rendered
+        self.assertEqual(document_requests, {f'/book/{books[1].pk}/': 1, '/book/1000/': 1})
+        self.assertEqual(
+            {url: (status, message) for url, status, message in Url.objects.values_list('url', 'status', 'message')},
+            {
+                f'/book/{books[0].pk}/': (True, 'Working internal link'),
+                f'/book/{books[1].pk}/': (True, 'Working internal link'),
+                f'/book/{books[1].pk}/#title': (True, 'Working internal link, working internal hash anchor'),
+                '/book/1000/': (False, 'Broken internal link'),
+            },
+        )
+
     def test_internal_check_working_redirect(self):
         uv = Url(url="/admin/linkcheck")
         uv.check_url()
@@ -815,6 +987,50 @@ class ExternalCheckTestCase(LiveServerTestCase):
         self.assertEqual(uv.redirect_to, f'{self.live_server_url}/http/anchor/')
         self.assertEqual(uv.type, 'external')
 
+    @patch("linkcheck.models.ANCHOR_MAX_BYTES", 20000)
+    def test_external_anchor_in_large_document(self):
+        uv = Url(url=f"{self.live_server_url}/http/anchor/large/#top")
+        uv.check_url()
+        self.assertEqual(uv.message, "200 OK, working external hash anchor")
+        self.assertEqual(uv.status, True)
+        self.assertEqual(uv.anchor_message, 'Working anchor')
+
+    @patch("linkcheck.models.TOLERATE_BROKEN_ANCHOR", False)
+    @patch("linkcheck.models.ANCHOR_MAX_BYTES", 20000)
+    def test_external_anchor_beyond_max_bytes(self):
+        uv = Url(url=f"{self.live_server_url}/http/anchor/large/#bottom")
+        uv.check_url()
+        self.assertEqual(uv.message, "200 OK, document too large to check anchor")
+        self.assertEqual(uv.status, False)
+        self.assertEqual(uv.anchor_message, 'Anchor could not be checked')
+
+    def test_anchor_finder(self):
+        document = "<html><body><p id='über'>Text</p><a name='end'></a></body></html>".encode()
+        chunks = [document[i:i + 4] for i in range(0, len(document), 4)]
+        finder = AnchorFinder(['über'], 'text/html; charset=utf-8')
+        fed = 0
+        for chunk in chunks:
+            fed += 1
+            if finder.feed_bytes(chunk):
+                break
+        self.assertLess(fed, len(chunks))
+        self.assertIs(finder.find_anchor('über'), True)
+        finder = AnchorFinder(['über', 'end', 'missing'], 'text/html')
+        for chunk in chunks:
+            self.assertFalse(finder.feed_bytes(chunk))
+        self.assertIs(finder.find_anchor('über'), True)
+        self.assertIs(finder.find_anchor('end'), True)
+        self.assertIs(finder.find_anchor('missing'), False)
+        finder = AnchorFinder(['über', 'end'], 'text/html', max_bytes=40)
+        self.assertTrue(any(finder.feed_bytes(chunk) for chunk in chunks))
+        self.assertIs(finder.find_anchor('über'), True)
+        self.assertIsNone(finder.find_anchor('end'))
+        # A single chunk larger than max_bytes
+        finder = AnchorFinder(['über', 'end'], 'text/html', max_bytes=40)
+        self.assertTrue(finder.feed_bytes(document))
+        self.assertIs(finder.find_anchor('über'), True)
+        self.assertIsNone(finder.find_anchor('end'))
+
     def test_video_with_time_anchor(self):
         uv = Url(url=f"{self.live_server_url}/static-files/video.mp4#t=2.0")
         uv.check_url()
@@ -852,6 +1068,865 @@ class ExternalCheckTestCase(LiveServerTestCase):
         self.assertEqual(uv.type, 'external')
 
 
+@override_settings(SITE_DOMAIN='example.com')
+class SessionTestCase(LiveServerTestCase):
+
+    @patch('linkcheck.models.POOL_MAXSIZE', 3)
+    def test_get_session_pool_size(self):
+        with get_session() as session:
+            adapter = session.get_adapter(self.live_server_url)
+            self.assertEqual(adapter._pool_maxsize, 3)
+
+    @patch('linkcheck.engines.POOL_MAXSIZE', 2)
+    def test_thread_engine_pool_size(self):
+        with ThreadEngine(workers=4) as engine:
+            self.assertEqual(engine.session.get_adapter(self.live_server_url)._pool_maxsize, 2)
+        with ThreadEngine(workers=1) as engine:
+            self.assertEqual(engine.session.get_adapter(self.live_server_url)._pool_maxsize, 1)
+
+    def test_check_links_shares_session(self):
+        Url.objects.create(url=f"{self.live_server_url}/http/200/")
+        Url.objects.create(url=f"{self.live_server_url}/http/404/")
+        Url.objects.create(url=f"{self.live_server_url}/http/anchor/#anchor")
+        with patch('linkcheck.engines.get_session', wraps=get_session) as mocked_get_session:
+            self.assertEqual(check_links(check_internal=False), 3)
+        mocked_get_session.assert_called_once()
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('status', 'message')),
+            [
+                (True, '200 OK'),
+                (False, '404 Not Found'),
+                (True, '200 OK, working external hash anchor'),
+            ],
+        )
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class ConcurrentCheckTestCase(LiveServerTestCase):
+
+    def setUp(self):
+        for path in ['/http/200/', '/http/404/', '/http/redirect/301/', '/timeout/', '/http/anchor/#anchor']:
+            Url.objects.create(url=f"{self.live_server_url}{path}")
+        Url.objects.create(url="/public/")
+
+    def test_check_links_workers(self):
+        self.assertEqual(check_links(workers=4), 6)
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('url', 'status', 'message')),
+            [
+                ('/public/', True, 'Working internal link'),
+                (f'{self.live_server_url}/http/200/', True, '200 OK'),
+                (f'{self.live_server_url}/http/404/', False, '404 Not Found'),
+                (f'{self.live_server_url}/http/anchor/#anchor', True, '200 OK, working external hash anchor'),
+                (f'{self.live_server_url}/http/redirect/301/', True, '301 Moved Permanently'),
+                (f'{self.live_server_url}/timeout/', False, 'Other Error: The read operation timed out'),
+            ],
+        )
+
+    def test_check_links_workers_limit(self):
+        self.assertEqual(check_links(check_internal=False, limit=2, workers=4), 2)
+        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 2)
+        self.assertEqual(check_links(check_internal=False, workers=4), 3)
+        self.assertEqual(Url.objects.filter(last_checked=None).count(), 1)
+
+    def test_checkexternal_command_workers(self):
+        out, err = get_command_output('checkexternal', '--workers', '3')
+        self.assertEqual(
+            out,
+            "Checking all external links which are due for a recheck.\n"
+            "5 external URLs have been checked.\n"
+        )
+
+
+class HostSchedulerTestCase(TestCase):
+
+    def test_interleave_hosts(self):
+        scheduler = HostScheduler(concurrency=2, delay=0)
+        for url in [
+            'https://a.example.com/1', 'https://a.example.com/2', 'https://a.example.com/3',
+            'https://b.example.com/1', 'https://c.example.com/1',
+        ]:
+            scheduler.add(Url(url=url))
+        self.assertEqual(len(scheduler), 5)
+        popped = [scheduler.pop().url for i in range(4)]
+        self.assertEqual(popped, [
+            'https://a.example.com/1', 'https://b.example.com/1', 'https://c.example.com/1', 'https://a.example.com/2',
+        ])
+        # Two checks are already running on a.example.com
+        self.assertIsNone(scheduler.pop())
+        self.assertIsNone(scheduler.wait_time())
+        done = Url(url='https://a.example.com/1')
+        done.status_code = 200
+        self.assertFalse(scheduler.done(done))
+        self.assertEqual(scheduler.pop().url, 'https://a.example.com/3')
+        self.assertEqual(len(scheduler), 0)
+
+    def test_host_delay(self):
+        scheduler = HostScheduler(concurrency=2, delay=30)
+        scheduler.add(Url(url='https://a.example.com/1'))
+        scheduler.add(Url(url='https://a.example.com/2'))
+        self.assertEqual(scheduler.pop().url, 'https://a.example.com/1')
+        self.assertIsNone(scheduler.pop())
+        self.assertAlmostEqual(scheduler.wait_time(), 30, delta=1)
+
+    def test_retry_after(self):
+        scheduler = HostScheduler(concurrency=2, delay=0, max_retry_after=120)
+        scheduler.add(Url(url='https://a.example.com/1'))
+        url = scheduler.pop()
+        url.status_code = 429
+        url.retry_after = 60
+        self.assertTrue(scheduler.done(url))
+        self.assertEqual(len(scheduler), 1)
+        self.assertIsNone(scheduler.pop())
+        self.assertAlmostEqual(scheduler.wait_time(), 60, delta=1)
+        # Retry-After exceeding the maximum is not honoured
+        url.retry_after = 600
+        self.assertFalse(scheduler.done(url))
+        # Server errors are only retried with a Retry-After header
+        url.status_code = 503
+        url.retry_after = None
+        self.assertFalse(scheduler.done(url))
+
+    def test_group_documents(self):
+        first, second = Url(url='http://example.org/page#first'), Url(url='http://example.org/page#second')
+        other = Url(url='http://example.org/other')
+        scheduler = HostScheduler(concurrency=3, delay=0)
+        for url in [first, second, other]:
+            scheduler.add(url)
+        self.assertEqual(len(scheduler), 2)
+        self.assertIs(scheduler.pop(), first)
+        self.assertEqual(scheduler.get_followers(first), [second])
+        # The document is requested again once its first check is running
+        third = Url(url='http://example.org/page#third')
+        scheduler.add(third)
+        self.assertIs(scheduler.pop(), other)
+        self.assertIs(scheduler.pop(), third)
+        self.assertFalse(scheduler.done(first))
+        self.assertEqual(scheduler.get_followers(first), [])
+
+    def test_dead_host_persisted(self):
+        url = Url(url='http://dead.example.org/1')
+        scheduler = HostScheduler(dead_host_threshold=1, dead_host_ttl=60)
+        scheduler.add(url)
+        self.assertIs(scheduler.pop(), url)
+        url.record_host_error('Name Resolution Error', 'Name Resolution Error')
+        url.host_unreachable = True
+        self.assertFalse(scheduler.done(url))
+        # The next run skips the host as well
+        scheduler = HostScheduler(dead_host_threshold=1, dead_host_ttl=60)
+        other = Url(url='http://dead.example.org/2')
+        scheduler.add(other)
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.pop_skipped(), [(other, ('Name Resolution Error', 'Name Resolution Error'))])
+        cache.clear()
+
+    def test_circuit_breaker(self):
+        scheduler = HostScheduler(concurrency=2, delay=0, circuit_breaker_threshold=2, circuit_breaker_cooldown=0)
+        urls = [Url(url=f'https://slow.example.com/{i}') for i in range(5)]
+        for url in urls:
+            scheduler.add(url)
+        for url in urls[:2]:
+            self.assertIs(scheduler.pop(), url)
+        for url in urls[:2]:
+            url.timed_out = True
+            scheduler.done(url)
+        # Only a single probe is checked once the breaker is open
+        self.assertIs(scheduler.pop(), urls[2])
+        self.assertIsNone(scheduler.pop())
+        urls[2].timed_out = True
+        scheduler.done(urls[2])
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(
+            [url for url, error in scheduler.pop_skipped()],
+            urls[3:],
+        )
+
+    def test_circuit_breaker_closes(self):
+        scheduler = HostScheduler(concurrency=1, delay=0, circuit_breaker_threshold=1, circuit_breaker_cooldown=0)
+        urls = [Url(url=f'https://slow.example.com/{i}') for i in range(3)]
+        for url in urls:
+            scheduler.add(url)
+        scheduler.pop()
+        urls[0].timed_out = True
+        scheduler.done(urls[0])
+        self.assertIs(scheduler.pop(), urls[1])
+        urls[1].status_code = 200
+        scheduler.done(urls[1])
+        self.assertIs(scheduler.pop(), urls[2])
+        self.assertEqual(scheduler.pop_skipped(), [])
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class RateLimitTestCase(LiveServerTestCase):
+
+    def test_check_links_retry_after(self):
+        Url.objects.create(url=f"{self.live_server_url}/http/rate-limit/1/1/")
+        Url.objects.create(url=f"{self.live_server_url}/http/rate-limit/1/2/")
+        Url.objects.create(url=f"{self.live_server_url}/http/rate-limit/3600/1/")
+        self.assertEqual(check_links(check_internal=False, workers=2), 3)
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('url', 'status', 'message')),
+            [
+                (f"{self.live_server_url}/http/rate-limit/1/1/", True, '200 OK'),
+                (f"{self.live_server_url}/http/rate-limit/1/2/", True, '200 OK'),
+                # Retry-After is too long to wait for it during this run
+                (f"{self.live_server_url}/http/rate-limit/3600/1/", False, '429 Too Many Requests'),
+            ],
+        )
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class ConditionalRecheckTestCase(LiveServerTestCase):
+
+    def test_recheck_not_modified(self):
+        uv = Url.objects.create(url=f"{self.live_server_url}/http/etag/1/#anchor")
+        uv.check_external()
+        self.assertEqual(uv.etag, '"v1"')
+        self.assertEqual(uv.message, '200 OK, working external hash anchor')
+        # The document does not contain the anchor any longer, but the ETag did not change
+        uv.check_external(external_recheck_interval=-1)
+        self.assertEqual(uv.status, True)
+        self.assertEqual(uv.status_code, 200)
+        self.assertEqual(uv.anchor_status, True)
+        self.assertEqual(uv.message, '200 OK, working external hash anchor')
+        self.assertEqual(uv.etag, '"v1"')
+
+    def test_recheck_last_modified(self):
+        url = 'http://www.example.org/page/'
+        last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        uv = Url(url=url)
+        with requests_mock.Mocker() as mocker:
+            mocker.register_uri('HEAD', url, [
+                {'status_code': 200, 'reason': 'OK', 'headers': {'Last-Modified': last_modified}},
+                {'status_code': 304, 'reason': 'Not Modified'},
+            ])
+            uv.check_external(commit=False)
+            self.assertNotIn('If-Modified-Since', mocker.last_request.headers)
+            uv.check_external(external_recheck_interval=-1, commit=False)
+            self.assertEqual(mocker.last_request.headers['If-Modified-Since'], last_modified)
+        self.assertEqual(uv.status, True)
+        self.assertEqual(uv.message, '200 OK')
+        self.assertEqual(uv.last_modified, last_modified)
+
+    def test_no_revalidation_after_failure(self):
+        url = 'http://www.example.org/page/'
+        uv = Url(url=url, status=False, status_code=404, etag='"v1"')
+        with requests_mock.Mocker() as mocker:
+            mocker.register_uri('HEAD', url, status_code=304, reason='Not Modified')
+            uv.check_external(commit=False)
+            self.assertNotIn('If-None-Match', mocker.last_request.headers)
+        self.assertEqual(uv.status, False)
+        self.assertEqual(uv.message, '304 Not Modified')
+        self.assertEqual(uv.etag, '')
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class HostHealthTestCase(LiveServerTestCase):
+
+    def test_check_links_skips_unreachable_host(self):
+        for i in range(5):
+            Url.objects.create(url=f"http://127.0.0.1:1/{i}/")
+        Url.objects.create(url=f"{self.live_server_url}/http/200/")
+        with patch.object(Url, 'check_external', autospec=True, side_effect=Url.check_external) as check_external:
+            self.assertEqual(check_links(check_internal=False, workers=1), 6)
+        # Only two URLs of the unreachable host were checked
+        self.assertEqual(check_external.call_count, 3)
+        dead_urls = Url.objects.filter(url__startswith='http://127.0.0.1:1/')
+        self.assertEqual(len({url.message for url in dead_urls}), 1)
+        self.assertFalse(dead_urls.filter(status=True).exists())
+        self.assertFalse(dead_urls.filter(last_checked=None).exists())
+        self.assertTrue(Url.objects.get(url=f"{self.live_server_url}/http/200/").status)
+
+    @patch('linkcheck.utils.HostScheduler', partial(
+        HostScheduler, circuit_breaker_threshold=2, circuit_breaker_cooldown=0
+    ))
+    def test_check_links_circuit_breaker(self):
+        for i in range(5):
+            Url.objects.create(url=f"{self.live_server_url}/timeout/?{i}")
+        self.assertEqual(check_links(check_internal=False, workers=1), 5)
+        self.assertEqual(
+            sorted(Url.objects.values_list('message', flat=True)),
+            ['Other Error: The read operation timed out'] * 3 + ['Skipped: the host timed out repeatedly'] * 2,
+        )
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class HostStrategyTestCase(LiveServerTestCase):
+
+    def test_learn_head_not_allowed(self):
+        host = Host(name='www.example.org')
+        with requests_mock.Mocker() as mocker:
+            mocker.head('http://www.example.org/1', status_code=405, reason='Method Not Allowed')
+            mocker.get('http://www.example.org/1', status_code=200, reason='OK')
+            mocker.get('http://www.example.org/2', status_code=200, reason='OK')
+            Url(url='http://www.example.org/1').check_external(commit=False, host=host)
+            self.assertTrue(host.use_get)
+            self.assertTrue(host.changed)
+            uv = Url(url='http://www.example.org/2')
+            uv.check_external(commit=False, host=host)
+            self.assertEqual(mocker.call_count, 3)
+            self.assertEqual(mocker.last_request.method, 'GET')
+        self.assertEqual(uv.message, '200 OK')
+
+    def test_learn_fallback_user_agent(self):
+        host = Host(name='localhost')
+        uv = Url(url=f"{self.live_server_url}/http/block-user-agent/")
+        uv.check_external(commit=False, host=host)
+        self.assertTrue(host.use_fallback_user_agent)
+        self.assertFalse(host.use_get)
+        self.assertEqual(uv.message, '200 OK')
+        with patch('requests.Session.head', wraps=requests.Session().head) as head:
+            uv.check_external(commit=False, external_recheck_interval=-1, host=host)
+        self.assertEqual(head.call_count, 1)
+        self.assertEqual(uv.message, '200 OK')
+
+    def test_learn_skip_ssl_verification(self):
+        host = Host(name='www.example.org')
+        exc = ConnectionError("SSLError: [SSL: CERTIFICATE_VERIFY_FAILED] unable to get local issuer certificate")
+        with requests_mock.Mocker() as mocker:
+            mocker.head('https://www.example.org/1', [{'exc': exc}, {'status_code': 200, 'reason': 'OK'}])
+            mocker.head('https://www.example.org/2', status_code=200, reason='OK')
+            uv = Url(url='https://www.example.org/1')
+            uv.check_external(commit=False, host=host)
+            self.assertTrue(host.skip_ssl_verification)
+            self.assertEqual(uv.message, '200 OK, SSL certificate could not be verified')
+            # The certificate is not verified any more, so its status is unknown
+            uv = Url(url='https://www.example.org/2')
+            uv.check_external(commit=False, host=host)
+            self.assertIsNone(uv.ssl_status)
+            self.assertEqual(uv.message, '200 OK, SSL certificate could not be verified')
+
+    def test_strategy_expires(self):
+        host = Host(name='www.example.org')
+        host.learn(use_get=True, skip_ssl_verification=True)
+        host.changed = False
+        host.expire(ttl=60)
+        self.assertTrue(host.skip_ssl_verification)
+        self.assertFalse(host.changed)
+        host.learned_at -= timedelta(seconds=61)
+        host.expire(ttl=60)
+        self.assertFalse(host.use_get)
+        self.assertFalse(host.skip_ssl_verification)
+        self.assertTrue(host.changed)
+
+    def test_save_strategy_of_new_host(self):
+        host = Host(name='www.example.org')
+        # Another process saves the same host in the meantime
+        Host.objects.create(name='www.example.org', use_fallback_user_agent=True)
+        host.learn(use_get=True)
+        host.save_strategy()
+        self.assertFalse(host.changed)
+        self.assertEqual(
+            list(Host.objects.values_list('id', 'use_get', 'use_fallback_user_agent')),
+            [(host.pk, True, False)],
+        )
+
+    def test_check_links_saves_host(self):
+        Url.objects.create(url=f"{self.live_server_url}/http/block-user-agent/block-head/")
+        Url.objects.create(url=f"{self.live_server_url}/http/200/")
+        self.assertEqual(check_links(check_internal=False, workers=1), 2)
+        host = Host.objects.get(name='localhost')
+        self.assertTrue(host.use_get)
+        self.assertTrue(host.use_fallback_user_agent)
+        self.assertFalse(host.skip_ssl_verification)
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class DocumentGroupTestCase(LiveServerTestCase):
+
+    def test_external_document_requested_once(self):
+        for anchor in ['first', 'second', 'missing']:
+            Url.objects.create(url=f"{self.live_server_url}/http/document/1/#{anchor}")
+        Url.objects.create(url=f"{self.live_server_url}/http/200/")
+        self.assertEqual(check_links(check_internal=False, workers=2), 4)
+        # One HEAD and one GET request for the three anchors
+        self.assertEqual(document_requests['/http/document/1/'], 2)
+        self.assertEqual(
+            list(Url.objects.filter(url__contains='document').order_by('url').values_list('status', 'message')),
+            [
+                (True, '200 OK, working external hash anchor'),
+                (True, '200 OK, broken external hash anchor'),
+                (True, '200 OK, working external hash anchor'),
+            ],
+        )
+        self.assertFalse(Url.objects.filter(last_checked=None).exists())
+
+    def test_external_document_anchors_apart(self):
+        Url.objects.create(url=f"{self.live_server_url}/http/document/5/#first")
+        for i in range(25):
+            Url.objects.create(url=f"{self.live_server_url}/http/200/?{i}")
+        Url.objects.create(url=f"{self.live_server_url}/http/document/5/#second")
+        self.assertEqual(check_links(check_internal=False, workers=1), 27)
+        # The URLs of the document are checked together, although they are far apart in the queue
+        self.assertEqual(document_requests['/http/document/5/'], 2)
+        self.assertEqual(
+            list(Url.objects.filter(url__contains='document').values_list('anchor_status', flat=True)),
+            [True, True],
+        )
+
+    def test_external_document_siblings_leased(self):
+        Url.objects.create(url=f"{self.live_server_url}/http/document/6/#first")
+        for i in range(25):
+            Url.objects.create(url=f"{self.live_server_url}/http/200/?{i}")
+        Url.objects.create(url=f"{self.live_server_url}/http/document/6/#second")
+        # Claimed by another process
+        Url.objects.create(
+            url=f"{self.live_server_url}/http/document/6/#third",
+            lease_expires=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(check_links(check_internal=False, workers=1, lease_duration=60), 27)
+        self.assertEqual(
+            list(Url.objects.filter(url__contains='document').order_by('id').values_list('anchor_status', flat=True)),
+            [True, True, None],
+        )
+        # The sibling was claimed before it was checked
+        self.assertIsNotNone(Url.objects.get(url__endswith='#second').lease_expires)
+
+    def test_external_document_limit(self):
+        for anchor in ['first', 'second', 'missing']:
+            Url.objects.create(url=f"{self.live_server_url}/http/document/2/#{anchor}")
+        self.assertEqual(check_links(check_internal=False, limit=2), 2)
+        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 2)
+
+    def test_internal_document_requested_once(self):
+        for anchor in ['first', 'second', 'missing']:
+            Url.objects.create(url=f"/http/document/3/#{anchor}")
+        self.assertEqual(check_links(check_external=False), 3)
+        self.assertEqual(document_requests['/http/document/3/'], 1)
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('anchor_status', flat=True)),
+            [True, False, True],
+        )
+
+
+@override_settings(ROOT_URLCONF='linkcheck.tests.urls')
+class ResultWriterTestCase(TestCase):
+
+    def test_check_links_writes_in_batches(self):
+        for code in [200, 404, 500]:
+            Url.objects.create(url=f"/http/{code}/")
+        with patch.object(Url, 'save') as save, patch.object(
+            Url.objects, 'bulk_update', wraps=Url.objects.bulk_update
+        ) as bulk_update:
+            self.assertEqual(check_links(check_external=False, batch_size=2), 3)
+        save.assert_not_called()
+        self.assertEqual([len(call.args[0]) for call in bulk_update.call_args_list], [2, 1])
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('status', 'status_code')),
+            [(True, 200), (False, 404), (False, 500)],
+        )
+        self.assertFalse(Url.objects.filter(last_checked=None).exists())
+
+    def test_unchanged_results_not_rewritten(self):
+        for code in [200, 404, 500]:
+            Url.objects.create(url=f"/http/{code}/")
+        self.assertEqual(check_links(check_external=False), 3)
+        Url.objects.filter(url='/http/404/').update(message='Outdated message')
+        yesterday = timezone.now() - timedelta(days=1)
+        Url.objects.update(last_checked=yesterday)
+        with patch.object(Url.objects, 'bulk_update', wraps=Url.objects.bulk_update) as bulk_update:
+            with self.assertNumQueries(3):
+                # The select, the update of the changed URL and the update of the dates
+                self.assertEqual(check_links(check_external=False), 3)
+        self.assertEqual(
+            [([url.url for url in call.args[0]], call.args[1]) for call in bulk_update.call_args_list],
+            [
+                (['/http/404/'], UPDATE_FIELDS),
+                (['/http/200/', '/http/500/'], ['last_checked', 'next_check_at']),
+            ],
+        )
+        self.assertEqual(Url.objects.get(url='/http/404/').message, 'Broken internal link')
+        self.assertFalse(Url.objects.filter(last_checked=yesterday).exists())
+
+    def test_flush_on_interruption(self):
+        urls = [Url.objects.create(url=f"/http/{code}/") for code in [200, 404, 500]]
+        with self.assertRaises(KeyboardInterrupt):
+            with ResultWriter(batch_size=2) as writer:
+                for url in urls:
+                    url.check_internal(commit=False)
+                    writer.add(url)
+                    if len(writer.urls) == 0:
+                        # The first batch is already written
+                        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 2)
+                raise KeyboardInterrupt
+        self.assertFalse(Url.objects.filter(last_checked=None).exists())
+
+    def test_check_links_saves_unchecked_links(self):
+        Url.objects.create(url="mailto:info@example.org")
+        self.assertEqual(check_links(check_external=False), 0)
+        url = Url.objects.get()
+        self.assertEqual(url.message, 'Email link (not automatically checked)')
+        self.assertIsNotNone(url.last_checked)
+
+
+@override_settings(ROOT_URLCONF='linkcheck.tests.urls')
+class InternalProcessesTestCase(TestCase):
+
+    def setUp(self):
+        for url in [
+            '/http/200/',
+            '/http/404/',
+            '/http/redirect/301/',
+            '/http/anchor/#anchor',
+            '/http/anchor/#missing',
+            'mailto:info@example.org',
+        ]:
+            Url.objects.create(url=url)
+
+    def get_results(self):
+        return list(Url.objects.order_by('url').values_list('url', 'status', 'message', 'anchor_status'))
+
+    def test_check_links_processes(self):
+        self.assertEqual(check_links(check_external=False), 5)
+        expected = self.get_results()
+        Url.objects.update(status=None, message='', anchor_status=None, last_checked=None)
+        self.assertEqual(check_links(check_external=False, processes=2), 5)
+        self.assertEqual(self.get_results(), expected)
+        self.assertFalse(Url.objects.filter(last_checked=None).exists())
+        self.assertEqual(
+            Url.objects.get(url='mailto:info@example.org').message,
+            'Email link (not automatically checked)',
+        )
+
+    def test_check_links_processes_spawn(self):
+        # The workers import linkcheck before Django is set up
+        with patch('linkcheck.utils.multiprocessing.Pool', multiprocessing.get_context('spawn').Pool):
+            self.assertEqual(check_links(check_external=False, processes=2), 5)
+        self.assertEqual(Url.objects.get(url='/http/404/').message, 'Broken internal link')
+
+    def test_check_links_processes_limit(self):
+        self.assertEqual(check_links(check_external=False, processes=2, limit=3), 3)
+        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 3)
+
+    def test_check_rows_in_processes(self):
+        check_links(check_external=False)
+        rows = Url.objects.order_by('url').values_list('id', 'url', *UPDATE_FIELDS)
+        written = []
+
+        class Writer:
+            def add(self, url):
+                written.append((url.url, url.result_changed))
+
+        self.assertEqual(check_internal_links_in_processes(rows, 2, writer=Writer()), 5)
+        # The saved results are kept with the rows, the unchanged results only update their dates
+        self.assertEqual(written, [(url, False) for url in Url.objects.order_by('url').values_list('url', flat=True)])
+
+    @override_settings(ALLOWED_HOSTS=['example.org'], PREPEND_WWW=True)
+    def test_check_links_threads(self):
+        self.assertEqual(check_links(check_external=False), 5)
+        expected = self.get_results()
+        Url.objects.update(status=None, message='', anchor_status=None, last_checked=None)
+        self.assertEqual(check_links(check_external=False, workers=4), 5)
+        self.assertEqual(self.get_results(), expected)
+        self.assertFalse(Url.objects.filter(last_checked=None).exists())
+        self.assertEqual(Url.objects.get(url='/http/200/').message, 'Working internal link')
+        # The settings are not changed for the checks
+        self.assertEqual(settings.ALLOWED_HOSTS, ['example.org'])
+        self.assertTrue(settings.PREPEND_WWW)
+
+    def test_shared_responses_have_parsed_anchors(self):
+        shared = []
+
+        class Responses(dict):
+            def __setitem__(self, path, response):
+                shared.append((path, response.content, response.anchors))
+                super().__setitem__(path, response)
+
+        url = Url.objects.get(url='/http/anchor/#anchor')
+        url.check_internal(Responses(), commit=False)
+        # The responses are shared by the threads once their anchors are parsed
+        self.assertEqual(shared, [('/http/anchor/', None, {'anchor'})])
+        self.assertTrue(url.anchor_status)
+
+    def test_check_links_unparsable_anchors(self):
+        for anchor in ['t=2', 't=3']:
+            Url.objects.create(url=f'/static-files/fake-video.mp4#{anchor}')
+        self.assertEqual(check_links(check_external=False), 7)
+        # Both URLs share the response whose anchors could not be parsed
+        self.assertEqual(
+            list(Url.objects.filter(url__contains='fake-video').values_list('message', flat=True)),
+            ['Working internal link, failed to parse HTML for anchor'] * 2,
+        )
+
+    def test_check_links_threads_limit(self):
+        self.assertEqual(check_links(check_external=False, workers=4, limit=3), 3)
+        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 3)
+
+
+@override_settings(ROOT_URLCONF='linkcheck.tests.urls')
+class CheckQueueTestCase(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        book = Book.objects.create(title='Book', description='')
+        for code, status, days, links in [
+            (200, True, 3, 0),
+            (201, True, 1, 2),
+            (404, False, 2, 0),
+            (500, None, None, 0),
+        ]:
+            url = Url.objects.create(
+                url=f"/http/{code}/",
+                status=status,
+                last_checked=now - timedelta(days=days) if days else None,
+            )
+            for i in range(links):
+                Link.objects.create(content_object=book, field='description', url=url, text=str(i))
+
+    def get_order(self, **kwargs):
+        return [url.url for url in get_check_queue(Url.objects.all(), **kwargs)]
+
+    def test_order(self):
+        self.assertEqual(self.get_order(), ['/http/500/', '/http/200/', '/http/404/', '/http/201/'])
+
+    def test_order_prioritized(self):
+        self.assertEqual(
+            self.get_order(prioritize_broken=True),
+            ['/http/500/', '/http/404/', '/http/200/', '/http/201/'],
+        )
+        self.assertEqual(
+            self.get_order(prioritize_linked=True),
+            ['/http/500/', '/http/201/', '/http/200/', '/http/404/'],
+        )
+
+    def test_limited_runs_cover_all_urls(self):
+        checked = []
+        for _ in range(4):
+            self.assertEqual(check_links(check_external=False, limit=1), 1)
+            checked.append(Url.objects.order_by('-last_checked').first().url)
+        self.assertEqual(checked, ['/http/500/', '/http/200/', '/http/404/', '/http/201/'])
+
+    def test_limited_runs_skip_external_urls_not_due(self):
+        now = timezone.now()
+        Url.objects.all().delete()
+        for i in range(2):
+            Url.objects.create(
+                url=f"https://www.example.org/{i}",
+                status=True,
+                last_checked=now - timedelta(days=2),
+                next_check_at=now + timedelta(days=1),
+            )
+            Url.objects.create(url=f"/http/20{i}/", last_checked=now - timedelta(days=1))
+        self.assertEqual(check_links(limit=2), 2)
+        self.assertEqual(
+            sorted(Url.objects.filter(last_checked__gt=now).values_list('url', flat=True)),
+            ['/http/200/', '/http/201/'],
+        )
+
+
+@override_settings(ROOT_URLCONF='linkcheck.tests.urls')
+class LeaseTestCase(TestCase):
+
+    def setUp(self):
+        for code in [200, 201, 404, 500]:
+            Url.objects.create(url=f"/http/{code}/")
+
+    def test_claims_are_disjoint(self):
+        queue = get_check_queue(Url.objects.all())
+        first = claim_urls(queue, lease_duration=60, batch_size=2)
+        second = claim_urls(queue, lease_duration=60, batch_size=2)
+        claimed = [next(first).url, next(second).url, next(first).url, next(second).url]
+        self.assertEqual(claimed, ['/http/200/', '/http/404/', '/http/201/', '/http/500/'])
+        self.assertEqual(list(first), [])
+        self.assertFalse(Url.objects.filter(lease_expires=None).exists())
+
+    def test_claimed_once_per_run(self):
+        queue = get_check_queue(Url.objects.all())
+        urls = claim_urls(queue, lease_duration=60, batch_size=1)
+        claimed = [next(urls).url]
+        # The lease runs out while last_checked was not advanced, e.g. after a rate limit
+        Url.objects.update(lease_expires=timezone.now() - timedelta(seconds=1))
+        claimed += [url.url for url in urls]
+        self.assertEqual(claimed, ['/http/200/', '/http/201/', '/http/404/', '/http/500/'])
+
+    def test_queue_read_once(self):
+        queue = get_check_queue(Url.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            claimed = [url.url for url in claim_urls(queue, lease_duration=60, batch_size=1)]
+        self.assertEqual(claimed, ['/http/200/', '/http/201/', '/http/404/', '/http/500/'])
+        # The batches only read their claimed URLs again, not the whole queue
+        queue_reads = [
+            query for query in queries.captured_queries
+            if 'ORDER BY' in query['sql'] and ' IN (' not in query['sql']
+        ]
+        self.assertEqual(len(queue_reads), 1)
+
+    def test_check_links_skips_leased_urls(self):
+        now = timezone.now()
+        Url.objects.filter(url='/http/200/').update(lease_expires=now + timedelta(minutes=1))
+        # The lease of a worker which died
+        Url.objects.filter(url='/http/404/').update(lease_expires=now - timedelta(minutes=1))
+        self.assertEqual(check_links(check_external=False, lease_duration=60), 3)
+        self.assertEqual(
+            list(Url.objects.filter(last_checked=None).values_list('url', flat=True)),
+            ['/http/200/'],
+        )
+        # The URLs are only checked once per run, their leases expire after the check
+        self.assertEqual(Url.objects.filter(lease_expires__gt=now).count(), 4)
+
+
+@override_settings(SITE_DOMAIN='example.com')
+class MaxDurationTestCase(LiveServerTestCase):
+
+    def test_check_links_max_duration(self):
+        for i in range(3):
+            Url.objects.create(url=f"{self.live_server_url}/timeout/?{i}")
+        # The running check is finished after the time is up
+        self.assertEqual(check_links(check_internal=False, workers=1, max_duration=1), 1)
+        self.assertEqual(Url.objects.filter(last_checked=None).count(), 2)
+        # The next run resumes with the URLs which were not checked
+        self.assertEqual(check_links(check_internal=False, workers=1, max_duration=1), 1)
+        self.assertEqual(Url.objects.filter(last_checked=None).count(), 1)
+
+    def test_checkinternal_max_duration(self):
+        Url.objects.create(url="/http/200/")
+        out = StringIO()
+        call_command('checkinternal', max_duration=60, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Checking all internal links.\n"
+            "Will stop checking after 60 seconds.\n"
+            "1 internal URLs have been checked.\n"
+        )
+        self.assertEqual(check_links(check_external=False, max_duration=0), 0)
+
+
+@override_settings(SITE_DOMAIN='example.com')
+@patch('linkcheck.models.RECHECK_JITTER', 0)
+@patch('linkcheck.models.MAX_RECHECK_INTERVAL', 30000)
+@patch('linkcheck.models.EXTERNAL_RECHECK_INTERVAL', 10000)
+class NextCheckTestCase(LiveServerTestCase):
+
+    def get_interval(self, url):
+        url = Url.objects.get(pk=url.pk)
+        return (url.next_check_at - url.last_checked) / timedelta(minutes=1)
+
+    def test_adaptive_interval(self):
+        url = Url.objects.create(url=f"{self.live_server_url}/http/200/")
+        url = Url.objects.get(pk=url.pk)
+        url.check_external()
+        self.assertEqual(self.get_interval(url), 10000)
+        # The interval grows while the result is unchanged
+        for interval in [20000, 30000, 30000]:
+            url = Url.objects.get(pk=url.pk)
+            url.check_external(external_recheck_interval=0)
+            self.assertEqual(self.get_interval(url), interval)
+        # And is shortened when the result changes
+        url = Url.objects.get(pk=url.pk)
+        url.url = f"{self.live_server_url}/http/404/"
+        url.check_external(external_recheck_interval=0)
+        self.assertEqual(self.get_interval(url), 5000)
+        url = Url.objects.get(pk=url.pk)
+        url.check_external(external_recheck_interval=0)
+        self.assertEqual(self.get_interval(url), 10000)
+
+    def test_check_links_due_urls(self):
+        now = timezone.now()
+        for path, last_checked, next_check_at in [
+            ('/http/200/', now - timedelta(days=30), now + timedelta(days=1)),
+            ('/http/201/', now - timedelta(hours=1), now - timedelta(minutes=1)),
+            ('/http/202/', now - timedelta(days=30), None),
+            ('/http/203/', now - timedelta(hours=1), None),
+        ]:
+            Url.objects.create(
+                url=f"{self.live_server_url}{path}", last_checked=last_checked, next_check_at=next_check_at
+            )
+        self.assertEqual(check_links(check_internal=False), 2)
+        self.assertEqual(
+            list(Url.objects.filter(last_checked__gt=now).order_by('url').values_list('url', flat=True)),
+            [f"{self.live_server_url}/http/201/", f"{self.live_server_url}/http/202/"],
+        )
+        # An explicit interval replaces next_check_at
+        self.assertEqual(check_links(check_internal=False, external_recheck_interval=10), 2)
+        self.assertFalse(Url.objects.filter(last_checked__lt=now).exists())
+
+
+@skipIf(aiohttp is None, "aiohttp is not installed")
+@override_settings(SITE_DOMAIN='example.com')
+class AsyncEngineTestCase(LiveServerTestCase):
+
+    def test_async_engine_same_results(self):
+        paths = [
+            '/http/200/',
+            '/http/200/r%C3%BCckmeldung/',
+            '/http/301/',
+            '/http/redirect/301/',
+            '/http/redirect/302/',
+            '/whatever/',
+            '/http/redirect_to_404/',
+            '/http/getonly/405/',
+            '/http/getonly/400/',
+            '/http/block-user-agent/',
+            '/http/block-user-agent/block-head/',
+            '/http/429/',
+            '/http/anchor/#anchor',
+            '/http/anchor/#broken-anchor',
+            '/http/anchor/large/#bottom',
+            '/http/redirect_to_anchor/#anchor',
+            '/static-files/video.mp4#t=2.0',
+            '/timeout/',
+        ]
+        fields = [
+            'status', 'status_code', 'redirect_status_code', 'redirect_to', 'ssl_status',
+            'anchor_status', 'message', 'error_message',
+        ]
+        with AsyncEngine(workers=4) as engine:
+            for path in paths:
+                with self.subTest(path=path):
+                    sync_url = Url(url=f"{self.live_server_url}{path}")
+                    sync_url.check_external(commit=False)
+                    async_url = Url(url=f"{self.live_server_url}{path}")
+                    engine.submit(async_url).result()
+                    for field in fields:
+                        self.assertEqual(getattr(async_url, field), getattr(sync_url, field), field)
+                    self.assertEqual(async_url.last_checked is None, sync_url.last_checked is None)
+
+    def test_async_engine_recheck_not_modified(self):
+        uv = Url(url=f"{self.live_server_url}/http/etag/2/#anchor")
+        with AsyncEngine(workers=1) as engine:
+            engine.submit(uv).result()
+            self.assertEqual(uv.etag, '"v1"')
+            uv.last_checked = None
+            engine.submit(uv).result()
+        self.assertEqual(uv.anchor_status, True)
+        self.assertEqual(uv.message, '200 OK, working external hash anchor')
+
+    def test_async_engine_followers(self):
+        urls = [Url(url=f"{self.live_server_url}/http/document/4/#{anchor}") for anchor in ['first', 'missing']]
+        with AsyncEngine(workers=1) as engine:
+            engine.submit(urls[0], urls[1:]).result()
+        self.assertEqual(document_requests['/http/document/4/'], 2)
+        self.assertEqual([url.anchor_status for url in urls], [True, False])
+        self.assertTrue(all(url.last_checked for url in urls))
+
+    def test_async_engine_missing_cert(self):
+        uv = Url(url=f"{self.live_server_url.replace('http://', 'https://')}/http/200/")
+        with AsyncEngine(workers=1) as engine:
+            engine.submit(uv).result()
+        self.assertEqual(uv.message, 'SSL Error: wrong version number')
+        self.assertEqual(uv.error_message, 'SSL Error: wrong version number')
+        self.assertEqual(uv.status, False)
+        self.assertEqual(uv.ssl_status, False)
+
+    def test_checkexternal_command_async_engine(self):
+        for path in ['/http/200/', '/http/404/', '/http/anchor/#anchor']:
+            Url.objects.create(url=f"{self.live_server_url}{path}")
+        out, err = get_command_output('checkexternal', '--engine', 'async', '--limit', '2')
+        self.assertEqual(
+            out,
+            "Checking all external links which are due for a recheck.\n"
+            "Will run maximum of 2 checks this run.\n"
+            "2 external URLs have been checked.\n"
+        )
+        self.assertEqual(Url.objects.exclude(last_checked=None).count(), 2)
+
+
 class ModelTestCase(TestCase):
 
     def test_str(self):
@@ -879,6 +1954,61 @@ class ModelTestCase(TestCase):
             ),
         )
 
+    def test_saved_result(self):
+        Url.objects.create(url='/http/200/', status=True, message='Working internal link')
+        url = Url.objects.get()
+        self.assertIsInstance(url.saved_result, Result)
+        self.assertEqual((url.saved_result.status, url.saved_result.message), (True, 'Working internal link'))
+        self.assertFalse(url.result_changed)
+        url.message = 'Changed'
+        self.assertTrue(url.result_changed)
+        self.assertIsNone(Url(url='/http/200/').saved_result)
+
+    @override_settings(SITE_DOMAIN='example.com')
+    def test_classification(self):
+        for url in ['http://www.example.org/#top', 'http://example.com/page/', 'mailto:info@example.org', '']:
+            Url.objects.create(url=url)
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('url_type', 'is_external', 'host_name', 'is_anchored')),
+            [
+                ('empty', False, '', False),
+                ('internal', False, '', False),
+                ('external', True, 'www.example.org', True),
+                ('mailto', False, '', False),
+            ],
+        )
+        url = Url.objects.get(url='http://example.com/page/')
+        url.url = 'https://www.example.net/page/'
+        url.save(update_fields=['url'])
+        url = Url.objects.get(pk=url.pk)
+        self.assertEqual((url.url_type, url.is_external, url.host_name), ('external', True, 'www.example.net'))
+
+    @override_settings(SITE_DOMAIN='example.com')
+    def test_classification_migration(self):
+        migration = import_module('linkcheck.migrations.0016_url_add_classification')
+        external_regex = re.compile(EXTERNAL_REGEX_STRING)
+        for url in [
+            'http://www.example.org/#top', 'https://test.example.com/page/', 'mailto:info@example.org',
+            'tel:+1234', '', '#top', '/media/file.pdf', '/page/', 'page/',
+        ]:
+            self.assertEqual(
+                migration.get_classification(url, external_regex, MEDIA_PREFIX),
+                Url(url=url).get_classification(),
+            )
+
+    def test_classify_urls(self):
+        Url.objects.create(url='http://www.example.org/page/')
+        Url.objects.create(url='http://www.example.net/page/')
+        with patch('linkcheck.models.SITE_DOMAINS', ['http://www.example.org']):
+            self.assertEqual(classify_urls(), 1)
+        self.assertEqual(
+            list(Url.objects.order_by('url').values_list('url_type', 'host_name')),
+            [('external', 'www.example.net'), ('internal', '')],
+        )
+        out = StringIO()
+        call_command('classifylinks', stdout=out)
+        self.assertEqual(out.getvalue(), "Classifying all URLs...\n1 URLs have been reclassified.\n")
+
 
 class ChecklinksTestCase(TestCase):
 
@@ -892,7 +2022,7 @@ class ChecklinksTestCase(TestCase):
         call_command('checklinks', stdout=out)
         self.assertEqual(
             out.getvalue(),
-            "Checking all links that haven't been tested for 10080 minutes.\n"
+            "Checking all internal links and the external links which are due for a recheck.\n"
             "1 internal URLs and 0 external URLs have been checked.\n"
         )
 
@@ -916,6 +2046,15 @@ class ChecklinksTestCase(TestCase):
             "1 internal URLs and 1 external URLs have been checked.\n"
         )
 
+        Url.objects.all().update(last_checked=timezone.now())
+        out = StringIO()
+        call_command('checklinks', externalinterval=0, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Checking all links that haven't been tested for 0 minutes.\n"
+            "1 internal URLs and 2 external URLs have been checked.\n"
+        )
+
 
 class FindingLinksTestCase(TestCase):
     def test_found_links(self):
@@ -930,6 +2069,14 @@ class FindingLinksTestCase(TestCase):
             transform=lambda obj: obj.url
         )
 
+    def test_iter_linklist(self):
+        Book.objects.create(title='My Title', description='<a href="http://www.example.org">Example</a>')
+        linklist, = BookLinklist().iter_linklist()
+        # Only the fields with links are loaded
+        self.assertEqual(linklist['object'].get_deferred_fields(), {'title'})
+        self.assertEqual(linklist['urls'], [('description', 'Example', 'http://www.example.org')])
+        self.assertEqual(BookLinklist().get_linklist(), [linklist])
+
     def test_urls_exceeding_max_length(self):
         self.assertEqual(Url.objects.all().count(), 0)
         with self.assertLogs(logger="linkcheck", level="WARN") as cm:
@@ -1159,6 +2306,18 @@ class ViewTestCase(TestCase):
         response = self.client.get(reverse('linkcheck_report'))
         self.assertContains(response, "<h1>Link Checker</h1>")
 
+    def test_report_type(self):
+        Author.objects.create(name="John Smith", website="http://www.example.org/john")
+        Author.objects.create(name="Jane Doe", website="mailto:jane@example.org")
+        Url.objects.update(status=False)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('linkcheck_report'), {'type': 'external'})
+        self.assertContains(response, "http://www.example.org/john")
+        self.assertNotContains(response, "mailto:jane@example.org")
+        response = self.client.get(reverse('linkcheck_report'), {'type': 'mailto'})
+        self.assertNotContains(response, "http://www.example.org/john")
+        self.assertContains(response, "mailto:jane@example.org")
+
     def test_report_ignore_unignore(self):
         Author.objects.create(name="John Smith", website="http://www.example.org/john")
         self.client.force_login(self.user)
@@ -23,7 +23,16 @@ urlpatterns = [
     path('http/redirect_to_404/', views.http_redirect_to_404),
     path('http/redirect_to_anchor/', views.http_redirect_to_anchor),
     path('http/brokenredirect/', RedirectView.as_view(url='/non-existent/')),
+    path('http/redirect_to_external/', RedirectView.as_view(url='https://elsewhere.example.com/http/404/')),
+    path('http/redirect_to_site_domain/', RedirectView.as_view(url='http://www.localhost/http/404/?page=2')),
+    path('http/redirect_loop/', RedirectView.as_view(url='/http/redirect_loop/')),
     path('http/anchor/', views.http_response_with_anchor),
+    path('http/anchor/large/', views.http_response_with_large_anchor),
+    path('http/etag/<int:id>/', views.http_response_with_etag),
+    path('http/document/<int:id>/', views.http_document),
+    path('http/rate-limit/<str:retry_after>/<int:id>/', views.http_rate_limit),
+    path('book/<int:pk>/', views.book_detail, name='book_detail'),
+    path('book/<int:book_id>/print/', views.book_print, name='book_print'),
     path('timeout/', views.timeout),
     path('static-files/video.mp4', views.static_video),
     path('static-files/fake-video.mp4', views.static_video_forged_content_type),
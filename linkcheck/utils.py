@@ -1,21 +1,54 @@
 import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import timedelta
+from itertools import islice
+from urllib.parse import unquote, urljoin, urlsplit
 
 from django.apps import apps
-from django.db import models
-from django.test.client import ClientHandler
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q
+from django.test.client import Client, ClientHandler
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
+from .engines import get_engine
 from .linkcheck_settings import (
+    ENGINE,
+    EXTERNAL_RECHECK_INTERVAL,
     HTML_FIELD_CLASSES,
     IMAGE_FIELD_CLASSES,
+    LEASE_DURATION,
+    MAX_DURATION,
     MAX_URL_LENGTH,
+    PRIORITIZE_BROKEN,
+    PRIORITIZE_LINKED,
+    PROCESSES,
+    SITEMAPS,
     URL_FIELD_CLASSES,
+    WORKERS,
+    WRITE_BATCH_SIZE,
 )
-from .models import Link, Url
+from .models import (
+    CLASSIFICATION_FIELDS,
+    UPDATE_FIELDS,
+    Host,
+    Link,
+    Result,
+    Url,
+)
+from .scheduler import HostScheduler, get_host
+from .workers import init_internal_worker
 
 logger = logging.getLogger(__name__)
 
+# The number of redirects followed for an internal URL, like the test client
+MAX_REDIRECTS = 20
+
 
 class LinkCheckHandler(ClientHandler):
     # Customize the ClientHandler to allow us removing some middlewares
@@ -97,25 +130,647 @@ class LinkCheckHandler(ClientHandler):
                 new_exception_middleware.append(method)
         self._exception_middleware = new_exception_middleware
 
+    def get_response(self, request):
+        # The host of the checks is not validated against ALLOWED_HOSTS,
+        # instead of adding it to the setting while the site is running
+        request.get_host = request._get_raw_host
+        return super().get_response(request)
+
 
-def check_links(external_recheck_interval=10080, limit=-1, check_internal=True, check_external=True):
+class InternalClient:
     """
-    Return the number of links effectively checked.
+    The test client which requests internal URLs, meant to be reused for a whole run:
+    its `LinkCheckHandler` only loads the middleware chain once.
+
+    It can be shared by several threads, each of them gets its own `Client` (and cookies).
+    The global settings are not changed, so the checks don't affect the requests
+    which are served at the same time.
+
+    The paths of `valid_paths` (see `get_sitemap_paths()`) are known to be working
+    and are not requested.
     """
 
-    urls = Url.objects.all()
+    def __init__(self, valid_paths=None):
+        self.valid_paths = valid_paths
+        self.handler = LinkCheckHandler()
+        # Load the middleware chain before the threads use the handler
+        self.handler.load_middleware()
+        self.local = threading.local()
+
+    def get_client(self):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+            client.handler = self.handler
+        return client
+
+    def get_host(self):
+        # A "www." host is not redirected by the CommonMiddleware when PREPEND_WWW is set
+        return "www.testserver" if settings.PREPEND_WWW else "testserver"
+
+    def is_valid_path(self, path):
+        return self.valid_paths is not None and unquote(path) in self.valid_paths
+
+    def get(self, path):
+        client = self.get_client()
+        # Do not send the cookies set by the responses to other pages
+        client.cookies.clear()
+        return client.get(path, HTTP_HOST=self.get_host())
+
+    def get_local_path(self, location, base_path="/"):
+        """
+        Return the path of the page of this site which `location` (of a redirect from
+        `base_path`) points to, or `None` if it points to another host
+        """
+        url = urlsplit(location)
+        if url.netloc and url.hostname not in ("testserver", "www.testserver"):
+            # The domains of the site, see `Url.internal_url`
+            internal_url = Url(url=location).internal_url
+            if internal_url is None:
+                return None
+            url = urlsplit(internal_url)
+        path = urljoin(base_path, url.path)
+        return f"{path}?{url.query}" if url.query else path
+
+    def follow(self, response):
+        """
+        Follow the redirects of a `response` returned by `get()`, starting from its `Location`,
+        so the redirecting page is not requested again. The redirects are listed
+        in the `redirect_chain` of the returned response, like with `Client.get(follow=True)`.
+
+        A redirect to another host is not followed, as the test client would render the page
+        of this site with the same path: the redirect is returned, its `Location` is the last
+        one of the `redirect_chain`.
+        """
+        client = self.get_client()
+        redirect_chain = []
+        while 300 <= response.status_code < 400 and len(redirect_chain) < MAX_REDIRECTS:
+            location = response.get("Location")
+            if not location:
+                break
+            redirect_chain.append((location, response.status_code))
+            path = self.get_local_path(location, response.request["PATH_INFO"])
+            if path is None:
+                break
+            scheme = urlsplit(location).scheme or response.request.get("wsgi.url_scheme")
+            response = client.get(path, HTTP_HOST=self.get_host(), secure=scheme == "https")
+        response.redirect_chain = redirect_chain
+        return response
+
+
+class ResultWriter:
+    """
+    Save the results of checked URLs in batches of `batch_size`, with one `bulk_update`
+    of the result fields per batch instead of a `save()` per URL.
+
+    Most rechecks find the same result as before. For these URLs, only `last_checked`
+    and `next_check_at` are written, with a single `bulk_update` per batch.
 
-    # An optimization for when check_internal is False
+    Used as a context manager, the remaining results are saved when the block is left,
+    also when the run is interrupted.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or WRITE_BATCH_SIZE
+        self.urls = []
+        self.unchanged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def add(self, url):
+        if url.result_changed:
+            self.urls.append(url)
+        elif url.last_checked != url.saved_result.last_checked:
+            self.unchanged.append(url)
+        else:
+            # Nothing to write, e.g. the URL was rate limited again
+            return
+        if len(self.urls) + len(self.unchanged) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.urls:
+            Url.objects.bulk_update(self.urls, UPDATE_FIELDS)
+        if self.unchanged:
+            Url.objects.bulk_update(self.unchanged, ["last_checked", "next_check_at"])
+        for url in self.urls + self.unchanged:
+            url.saved_result = url.get_result()
+        self.urls = []
+        self.unchanged = []
+
+
+def get_check_queue(urls, prioritize_broken=None, prioritize_linked=None):
+    """
+    Order `urls` by the priority of their check: the URLs which were never checked first,
+    then the least recently checked ones, so that runs with a limit cover all URLs over time.
+
+    With `prioritize_broken`, the broken URLs are checked before the working ones, and with
+    `prioritize_linked`, the URLs with more links before those with fewer links.
+    """
+    if prioritize_broken is None:
+        prioritize_broken = PRIORITIZE_BROKEN
+    if prioritize_linked is None:
+        prioritize_linked = PRIORITIZE_LINKED
+
+    order = []
+    if prioritize_broken or prioritize_linked:
+        # The priorities only apply to the URLs which were checked before
+        order.append(ExpressionWrapper(Q(last_checked=None), output_field=BooleanField()).desc())
+    if prioritize_broken:
+        order.append(ExpressionWrapper(Q(status=False), output_field=BooleanField()).desc())
+    if prioritize_linked:
+        urls = urls.annotate(link_count=Count("links"))
+        order.append(F("link_count").desc())
+    return urls.order_by(*order, F("last_checked").asc(nulls_first=True), "id")
+
+
+def lease_urls(ids, lease_duration, started=None):
+    """
+    Claim the URLs of `ids` which are not leased by another process, with a lease of
+    `lease_duration` seconds, and return the ids of the claimed URLs.
+    With `started`, the URLs checked since that date are not claimed.
+
+    The URLs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so two processes never
+    claim the same URL.
+    """
+    now = timezone.now()
+    free = Q(lease_expires=None) | Q(lease_expires__lt=now)
+    if started is not None:
+        free &= Q(last_checked=None) | Q(last_checked__lt=started)
+    with transaction.atomic():
+        claimed = list(
+            Url.objects.filter(free, id__in=ids).select_for_update(skip_locked=True).values_list("id", flat=True)
+        )
+        Url.objects.filter(id__in=claimed).update(lease_expires=now + timedelta(seconds=lease_duration))
+    return claimed
+
+
+def claim_urls(urls, lease_duration, batch_size=None):
+    """
+    Yield the URLs of `urls` in their order, after claiming them in batches of `batch_size`
+    with a lease of `lease_duration` seconds (see `lease_urls()`), so that several processes
+    can check the same database together.
+
+    The leases are not released after the check but expire, which also frees the URLs claimed
+    by a process which died. The queue is read once, with a cursor, and only its URLs which
+    were not checked since the start of the run are claimed, so every URL is checked at most
+    once per run, even when its check does not advance `last_checked` (e.g. when the host
+    asked to retry later).
+    """
+    batch_size = batch_size or WRITE_BATCH_SIZE
+    started = timezone.now()
+    free = Q(lease_expires=None) | Q(lease_expires__lt=started)
+    ids = urls.filter(free).values_list("id", flat=True).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(ids, batch_size))
+        if not batch:
+            return
+        claimed = lease_urls(batch, lease_duration, started)
+        # Read from `urls` again, which keeps their order and their fields (e.g. with values_list())
+        yield from urls.filter(id__in=claimed)
+
+
+def get_due_filter(external_recheck_interval=None):
+    """
+    Return a filter for the URLs which are due for a check: those which were not checked during
+    the last `external_recheck_interval` minutes, or by default, whose `next_check_at` is reached.
+    """
+    now = timezone.now()
+    if external_recheck_interval is None:
+        # URLs checked before next_check_at was introduced are due after EXTERNAL_RECHECK_INTERVAL
+        recheck_datetime = now - timedelta(minutes=EXTERNAL_RECHECK_INTERVAL)
+        return Q(next_check_at__lte=now) | Q(next_check_at=None) & ~Q(last_checked__gt=recheck_datetime)
+    recheck_datetime = now - timedelta(minutes=external_recheck_interval)
+    return ~Q(last_checked__gt=recheck_datetime)
+
+
+def get_sitemap_paths(sitemaps):
+    """
+    Return the set of the paths listed by `sitemaps`, a dictionary of `Sitemap` classes
+    or instances like the one passed to the sitemap view, or the dotted path to such a dictionary.
+    """
+    if isinstance(sitemaps, str):
+        sitemaps = import_string(sitemaps)
+    paths = set()
+    for sitemap in sitemaps.values():
+        if callable(sitemap):
+            sitemap = sitemap()
+        for item in sitemap.items():
+            location = urlsplit(sitemap.location(item))
+            path = f"{location.path}?{location.query}" if location.query else location.path
+            paths.add(unquote(path))
+    return paths
+
+
+def check_links(
+    external_recheck_interval=None,
+    limit=-1,
+    check_internal=True,
+    check_external=True,
+    workers=None,
+    engine=None,
+    batch_size=None,
+    lease_duration=None,
+    max_duration=None,
+    processes=None,
+    sitemaps=None,
+):
+    """
+    Return the number of links effectively checked.
+
+    External links are rechecked after `external_recheck_interval` minutes,
+    by default when their `next_check_at` date is reached.
+    The URLs are checked in the order of `get_check_queue()`, so a run which stopped
+    at its `limit` or after `max_duration` seconds is resumed by the next run, which
+    starts with the URLs which were not checked.
+    External links are checked by `workers` threads of the "sync" engine,
+    or by the "async" engine (with at most `workers` simultaneous connections).
+    When only internal links are checked, they are checked by `processes` worker processes,
+    or else by `workers` threads.
+    The results are saved in batches of `batch_size` URLs.
+    With a `lease_duration`, the URLs are claimed with `claim_urls()` before they are checked,
+    so that several processes can check the links at the same time.
+    Internal URLs listed by `sitemaps` (see `get_sitemap_paths()`) are marked as working
+    without rendering their page, except the ones with an anchor.
+    """
+
+    urls = get_check_queue(Url.objects.all())
+    workers = workers or WORKERS
+    engine = engine or ENGINE
+    processes = processes or PROCESSES
+    sitemaps = sitemaps or SITEMAPS
+    if max_duration is None:
+        max_duration = MAX_DURATION
+    deadline = None if max_duration is None else time.monotonic() + max_duration
+
+    # Skip the URLs which are not checked in the database, also the external URLs which are not due,
+    # so that they don't take the place of URLs which are checked in runs with a limit
+    if check_external:
+        urls = urls.filter(Q(is_external=False) | get_due_filter(external_recheck_interval))
+    else:
+        urls = urls.filter(is_external=False)
     if not check_internal:
-        recheck_datetime = timezone.now() - timedelta(minutes=external_recheck_interval)
-        urls = urls.exclude(last_checked__gt=recheck_datetime)
+        urls = urls.filter(is_external=True)
+
+    # The worker processes only need the id and the URL, and the saved result is kept to write
+    # the results, so the rows are read as tuples instead of model instances
+    in_processes = not check_external and processes > 1
+    if in_processes:
+        urls = urls.values_list("id", "url", *UPDATE_FIELDS)
+
+    if lease_duration is None:
+        lease_duration = LEASE_DURATION
+    if lease_duration:
+        urls = claim_urls(urls, lease_duration, batch_size)
+    else:
+        # Read the URLs in chunks instead of caching all of them in the queryset
+        urls = urls.iterator()
+
+    # The index of the valid paths is built once for the whole run
+    valid_paths = get_sitemap_paths(sitemaps) if check_internal and sitemaps else None
+
+    if check_external:
+        with get_engine(engine, workers) as checker, ResultWriter(batch_size) as writer:
+            return check_links_concurrently(
+                urls,
+                checker,
+                workers,
+                limit=limit,
+                check_internal=check_internal,
+                writer=writer,
+                deadline=deadline,
+                external_recheck_interval=external_recheck_interval,
+                internal_client=InternalClient(valid_paths),
+                lease_duration=lease_duration,
+            )
+
+    if in_processes:
+        with ResultWriter(batch_size) as writer:
+            return check_internal_links_in_processes(
+                urls, processes, limit=limit, writer=writer, deadline=deadline, valid_paths=valid_paths
+            )
+    if workers > 1:
+        with ResultWriter(batch_size) as writer:
+            return check_internal_links_in_threads(
+                urls, workers, limit=limit, writer=writer, deadline=deadline, client=InternalClient(valid_paths)
+            )
 
     check_count = 0
-    for u in urls:
-        status = u.check_url(check_internal=check_internal, check_external=check_external)
-        check_count += 1 if status is not None else 0
-        if -1 < limit <= check_count:
+    internal_responses = {}
+    internal_client = InternalClient(valid_paths)
+    with ResultWriter(batch_size) as writer:
+        for u in urls:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            status = u.check_url(
+                check_internal=check_internal,
+                check_external=check_external,
+                internal_responses=internal_responses,
+                commit=False,
+                internal_client=internal_client,
+            )
+            if check_internal and u.internal:
+                # Also save the links which are not automatically checked, like email links
+                writer.add(u)
+            check_count += 1 if status is not None else 0
+            if -1 < limit <= check_count:
+                break
+
+    return check_count
+
+
+# The responses to internal pages with anchors, and the client, of a worker process,
+# see `linkcheck.workers.init_internal_worker()`
+worker_internal_responses = {}
+worker_internal_client = None
+
+
+def check_internal_urls(urls):
+    """
+    Check the internal `urls` (`(id, url)` pairs) in a worker process and return their results
+    """
+    results = []
+    for id, url in urls:
+        url = Url(id=id, url=url)
+        url.check_internal(worker_internal_responses, commit=False, client=worker_internal_client)
+        results.append(url.get_result())
+    return results
+
+
+def check_internal_links_in_processes(
+    urls, processes, limit=-1, writer=None, deadline=None, chunk_size=20, valid_paths=None
+):
+    """
+    Check the internal links of `urls` in `processes` worker processes, which render the
+    pages in parallel. `urls` are rows of the id, the URL and the saved result of the URLs
+    (the `UPDATE_FIELDS`), like `values_list("id", "url", *UPDATE_FIELDS)`.
+    The URLs are sent to the processes in chunks of `chunk_size`, and their results are saved
+    by `writer` in the calling process.
+    The paths of `valid_paths` are not rendered, see `InternalClient`.
+
+    Return the number of links effectively checked.
+    """
+    if writer is None:
+        with ResultWriter() as writer:
+            return check_internal_links_in_processes(urls, processes, limit, writer, deadline, chunk_size, valid_paths)
+
+    check_count = 0
+    pending = deque()
+    urls = iter(urls)
+
+    def checks_left():
+        if deadline is not None and time.monotonic() >= deadline:
+            return 0
+        return float("inf") if limit < 0 else limit - check_count - sum(len(chunk) for chunk, _ in pending)
+
+    # The worker processes open their own database connections
+    connections.close_all()
+    with multiprocessing.Pool(processes, initializer=init_internal_worker, initargs=(valid_paths,)) as pool:
+        while True:
+            while urls is not None and len(pending) < 2 * processes and checks_left() > 0:
+                size = min(chunk_size, checks_left())
+                chunk = []
+                for u in urls:
+                    chunk.append(u)
+                    if len(chunk) >= size:
+                        break
+                else:
+                    urls = None
+                if chunk:
+                    pending.append((chunk, pool.apply_async(check_internal_urls, ([row[:2] for row in chunk],))))
+            if not pending:
+                break
+
+            chunk, results = pending.popleft()
+            for row, result in zip(chunk, results.get()):
+                if -1 < limit <= check_count:
+                    break
+                # Only the instances of the URLs being written are created
+                u = Url(id=row[0], url=row[1], **result._asdict())
+                u.saved_result = Result._make(row[2:])
+                writer.add(u)
+                check_count += 1 if u.status is not None else 0
+
+    return check_count
+
+
+def check_internal_links_in_threads(urls, workers, limit=-1, writer=None, deadline=None, client=None):
+    """
+    Check the internal links of `urls` in `workers` threads of this process, which share
+    one `InternalClient` (`client`). Their results are saved by `writer` in the calling thread,
+    in the order of `urls`.
+
+    Return the number of links effectively checked.
+    """
+    if writer is None:
+        with ResultWriter() as writer:
+            return check_internal_links_in_threads(urls, workers, limit, writer, deadline, client)
+
+    check_count = 0
+    pending = deque()
+    internal_responses = {}
+    client = client or InternalClient()
+    urls = iter(urls)
+
+    def checks_left():
+        if deadline is not None and time.monotonic() >= deadline:
+            return 0
+        return float("inf") if limit < 0 else limit - check_count - len(pending)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while urls is not None and len(pending) < 2 * workers and checks_left() > 0:
+                u = next(urls, None)
+                if u is None:
+                    urls = None
+                else:
+                    future = executor.submit(u.check_internal, internal_responses, commit=False, client=client)
+                    pending.append((u, future))
+            if not pending:
+                break
+
+            u, future = pending.popleft()
+            status = future.result()
+            if -1 < limit <= check_count:
+                continue
+            writer.add(u)
+            check_count += 1 if status is not None else 0
+
+    return check_count
+
+
+def get_document_urls(url):
+    """
+    Return the other URLs of the document of `url`, which only differ by their anchor
+    """
+    document = url.url.split("#")[0]
+    return Url.objects.filter(Q(url=document) | Q(url__startswith=f"{document}#")).exclude(id=url.id)
+
+
+def check_links_concurrently(
+    urls,
+    checker,
+    workers,
+    limit=-1,
+    check_internal=True,
+    writer=None,
+    deadline=None,
+    external_recheck_interval=None,
+    internal_client=None,
+    lease_duration=None,
+):
+    """
+    Check the external links of `urls` with the engine `checker`, at most `workers` at the same time.
+    The order of the checks is decided by a `HostScheduler`, which also groups the URLs
+    of the same document so it is only requested once. When a URL with an anchor is queued,
+    the other URLs of its document are queued with it (see `get_document_urls()`), after being
+    leased for `lease_duration` seconds if the URLs are claimed (see `claim_urls()`).
+    The URLs of a host are requested with the strategy stored in its `Host`, which is updated
+    from what the checks learn.
+    Only the requests are made concurrently, the results are saved from the calling thread
+    in batches by `writer`, a `ResultWriter`.
+    Other links are checked one after the other, internal ones with `internal_client`.
+    After the `time.monotonic()` `deadline`, no more checks are started, but the running
+    ones are finished.
+
+    Return the number of links effectively checked.
+    """
+    if writer is None:
+        with ResultWriter() as writer:
+            return check_links_concurrently(
+                urls,
+                checker,
+                workers,
+                limit=limit,
+                check_internal=check_internal,
+                writer=writer,
+                deadline=deadline,
+                external_recheck_interval=external_recheck_interval,
+                internal_client=internal_client,
+                lease_duration=lease_duration,
+            )
+
+    check_count = 0
+    pending = {}
+    scheduler = HostScheduler()
+    internal_responses = {}
+    hosts = {}
+    urls = iter(urls)
+    # Read ahead, so that the checks can be spread over many hosts
+    lookahead = workers * 10
+    # The URLs which were queued with the other URLs of their document, and these documents
+    queued_ids = set()
+    grouped_documents = set()
+
+    def time_left():
+        return float("inf") if deadline is None else max(deadline - time.monotonic(), 0)
+
+    def checks_left():
+        if time_left() <= 0:
+            return 0
+        return float("inf") if limit < 0 else limit - check_count - sum(map(len, pending.values()))
+
+    def get_host_strategy(url):
+        name = get_host(url)
+        if name not in hosts:
+            hosts[name] = Host.objects.filter(name=name).first() or Host(name=name)
+            hosts[name].expire()
+        return hosts[name]
+
+    def queue(url):
+        queued_ids.add(url.pk)
+        scheduler.add(url)
+        document = url.url.split("#")[0]
+        if url.has_anchor and document not in grouped_documents:
+            # The other URLs of the document are rarely next to each other in the queue
+            grouped_documents.add(document)
+            # The queued URLs are skipped here rather than in the query, which would grow with the run
+            siblings = [
+                sibling
+                for sibling in get_document_urls(url)
+                if sibling.pk not in queued_ids and not sibling.recently_checked(external_recheck_interval)
+            ]
+            if lease_duration and siblings:
+                # Like the URLs of the queue, the siblings are only checked by the process which claimed them
+                claimed = set(lease_urls([sibling.pk for sibling in siblings], lease_duration))
+                siblings = [sibling for sibling in siblings if sibling.pk in claimed]
+            for sibling in siblings:
+                queued_ids.add(sibling.pk)
+                scheduler.add(sibling)
+
+    def collect(timeout):
+        nonlocal check_count
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            checked = pending.pop(future)
+            status = future.result()
+            host = get_host_strategy(checked[0])
+            if host.changed and host.name:
+                host.save_strategy()
+            if scheduler.done(checked[0]):
+                continue
+            for url in checked:
+                writer.add(url)
+            check_count += len(checked) if status is not None else 0
+
+    while True:
+        while urls is not None and len(scheduler) < lookahead and checks_left() > 0:
+            u = next(urls, None)
+            if u is None:
+                urls = None
+            elif u.pk is not None and u.pk in queued_ids:
+                # Already checked together with another URL of its document
+                continue
+            elif u.external:
+                if not u.recently_checked(external_recheck_interval):
+                    queue(u)
+                # Otherwise, the URL keeps its last result and is not counted as checked
+            else:
+                status = u.check_url(
+                    check_internal=check_internal,
+                    external_recheck_interval=external_recheck_interval,
+                    internal_responses=internal_responses,
+                    commit=False,
+                    internal_client=internal_client,
+                )
+                check_count += 1 if status is not None else 0
+                if check_internal and u.internal:
+                    # Recently checked external URLs are unchanged
+                    writer.add(u)
+
+        # The URLs of unreachable hosts get the error of the last check on the host
+        for u, (message, error_message) in scheduler.pop_skipped():
+            if checks_left() <= 0:
+                break
+            u.record_host_error(message, error_message)
+            u.finish_external_check(commit=False)
+            writer.add(u)
+            check_count += 1
+
+        while len(pending) < workers and checks_left() > 0:
+            u = scheduler.pop()
+            if u is None:
+                break
+            followers = scheduler.get_followers(u)
+            if limit >= 0:
+                # Do not exceed the limit with the URLs checked together
+                del followers[checks_left() - 1:]
+            pending[checker.submit(u, followers, get_host_strategy(u))] = [u, *followers]
+
+        if pending:
+            # Wake up when a check is done, or when a host is ready if more checks can be started
+            can_submit = len(pending) < workers and checks_left() > 0
+            wait_time = scheduler.wait_time() if can_submit else None
+            collect(timeout=None if wait_time is None else min(wait_time, time_left()))
+        elif checks_left() <= 0 or (urls is None and not scheduler):
             break
+        else:
+            # All queued hosts are waiting for their delay or a rate limit to pass
+            time.sleep(min(scheduler.wait_time(), time_left()))
 
     return check_count
 
@@ -180,9 +835,7 @@ def find_all_links(linklists=None):
 
     for linklist_name, linklist_cls in linklists.items():
         content_type = linklist_cls.content_type()
-        linklists = linklist_cls().get_linklist()
-
-        for linklist in linklists:
+        for linklist in linklist_cls().iter_linklist():
             object_id = linklist["object"].pk
             urls = linklist["urls"] + linklist["images"]
             if urls:
@@ -216,6 +869,29 @@ def find_all_links(linklists=None):
     }
 
 
+def classify_urls(batch_size=None):
+    """
+    Update the classification fields of all URLs, which is needed after changing the
+    SITE_DOMAINS (or SITE_DOMAIN) or LINKCHECK_MEDIA_PREFIX settings.
+
+    Return the number of URLs whose classification changed.
+    """
+    batch_size = batch_size or WRITE_BATCH_SIZE
+    changed = []
+    count = 0
+    for url in Url.objects.only("id", "url", *CLASSIFICATION_FIELDS).iterator(chunk_size=batch_size):
+        classification = url.get_classification()
+        if any(getattr(url, field) != value for field, value in classification.items()):
+            url.classify()
+            changed.append(url)
+        if len(changed) >= batch_size:
+            Url.objects.bulk_update(changed, CLASSIFICATION_FIELDS)
+            count += len(changed)
+            changed = []
+    Url.objects.bulk_update(changed, CLASSIFICATION_FIELDS)
+    return count + len(changed)
+
+
 def unignore():
     Link.objects.update(ignore=False)
 
@@ -91,6 +91,13 @@ def report(request):
         qset = qset.filter(ignore=False, url__status__exact=False)
         report_type = _('Broken links')
 
+    # Restrict the report to internal or external links, or to a type of URL
+    url_type = request.GET.get('type')
+    if url_type in ('internal', 'external'):
+        qset = qset.filter(url__is_external=url_type == 'external')
+    elif url_type:
+        qset = qset.filter(url__url_type=url_type)
+
     paginated_links = Paginator(qset, RESULTS_PER_PAGE, 0, True)
 
     try:
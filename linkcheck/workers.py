@@ -0,0 +1,19 @@
+"""
+The setup of the worker processes which check internal links, see
+`linkcheck.utils.check_internal_links_in_processes()`.
+
+This module must not import the models: with the "spawn" and "forkserver" start methods,
+a new worker imports it to run `init_internal_worker()`, before Django is set up.
+"""
+import django
+from django.apps import apps
+
+
+def init_internal_worker(valid_paths=None):
+    if not apps.ready:
+        # The worker was not forked from a process where Django is set up
+        django.setup()
+
+    from linkcheck import utils
+
+    utils.worker_internal_client = utils.InternalClient(valid_paths)